@@ -0,0 +1,105 @@
+from collections import deque
+from datetime import datetime
+import math
+import os
+
+# Peso de cada lectura nueva en la media/varianza exponencial y lecturas mínimas antes de alertar
+ANOMALY_ALPHA = float(os.getenv("ANOMALY_ALPHA", "0.02"))
+ANOMALY_MIN_SAMPLES = int(os.getenv("ANOMALY_MIN_SAMPLES", "30"))
+# Umbrales de z-score: subida o bajada brusca de temperatura, ráfaga de ruido, caída de luz
+ANOMALY_TEMPERATURE_Z = float(os.getenv("ANOMALY_TEMPERATURE_Z", "5"))
+ANOMALY_NOISE_Z = float(os.getenv("ANOMALY_NOISE_Z", "4"))
+ANOMALY_LIGHT_Z = float(os.getenv("ANOMALY_LIGHT_Z", "4"))
+# Alertas que se guardan en memoria para GET /alerts
+ALERT_HISTORY = int(os.getenv("ALERT_HISTORY", "500"))
+
+
+# Media y varianza con pesos exponenciales (EWMA): O(1) en tiempo y memoria por lectura
+class EwmaStats:
+    __slots__ = ("alpha", "count", "mean", "variance")
+
+    def __init__(self, alpha: float):
+        self.alpha = alpha
+        self.count = 0
+        self.mean = 0.0
+        self.variance = 0.0
+
+    # Devuelve el z-score de `value` respecto de lo visto hasta ahora y actualiza las estadísticas
+    def update(self, value: float):
+        if self.count == 0:
+            self.count = 1
+            self.mean = value
+            return None
+        diff = value - self.mean
+        stddev = math.sqrt(self.variance)
+        zscore = diff / stddev if stddev > 0 else None
+        increment = self.alpha * diff
+        self.mean += increment
+        self.variance = (1 - self.alpha) * (self.variance + diff * increment)
+        self.count += 1
+        return zscore
+
+
+# Reglas por métrica: (tipo de alerta, dirección, umbral); dirección 1 = subida, -1 = bajada, 0 = ambas
+RULES = {
+    "temperature": ("temperature_spike", 0, ANOMALY_TEMPERATURE_Z),
+    "noise": ("noise_burst", 1, ANOMALY_NOISE_Z),
+    "light": ("light_drop", -1, ANOMALY_LIGHT_Z),
+}
+
+
+class AnomalyDetector:
+    def __init__(self, rules=RULES, alpha: float = ANOMALY_ALPHA, min_samples: int = ANOMALY_MIN_SAMPLES, history: int = ALERT_HISTORY):
+        self.rules = rules
+        self.alpha = alpha
+        self.min_samples = min_samples
+        # Estadísticas por (placa, métrica): cada placa tiene su propia línea base
+        self.stats = {}
+        self.alerts = deque(maxlen=history)
+        self.observed = 0
+
+    def observe(self, doc):
+        self.observed += 1
+        for metric, (kind, direction, threshold) in self.rules.items():
+            value = doc.get(metric)
+            if value is None:
+                continue
+            key = (doc.get("device_id"), metric)
+            stats = self.stats.get(key)
+            if stats is None:
+                stats = self.stats[key] = EwmaStats(self.alpha)
+            mean = stats.mean
+            stddev = math.sqrt(stats.variance)
+            warmed_up = stats.count >= self.min_samples
+            zscore = stats.update(value)
+            if not warmed_up or zscore is None:
+                continue
+            if (abs(zscore) if direction == 0 else direction * zscore) >= threshold:
+                self.alerts.append({
+                    "type": kind,
+                    "metric": metric,
+                    "device_id": key[0],
+                    "value": value,
+                    "expected": mean,
+                    "stddev": stddev,
+                    "zscore": zscore,
+                    "timestamp": doc.get("timestamp"),
+                    "detected_at": datetime.utcnow(),
+                })
+
+    def observe_many(self, docs):
+        for doc in docs:
+            self.observe(doc)
+
+    # Alertas más recientes primero, opcionalmente filtradas por métrica y por placa
+    def recent(self, limit: int = 100, metric: str = None, device_id: str = None):
+        alerts = []
+        for alert in reversed(self.alerts):
+            if (metric is None or alert["metric"] == metric) and (device_id is None or alert["device_id"] == device_id):
+                alerts.append(alert)
+                if len(alerts) >= limit:
+                    break
+        return alerts
+
+
+anomaly_detector = AnomalyDetector()
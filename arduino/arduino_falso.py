@@ -0,0 +1,78 @@
+import argparse
+import os
+import random
+import select
+import time
+import tty
+from protocolo import SimuladorTramas
+
+# Arduino falso sobre un pseudo-terminal (solo Linux/macOS) para probar el bot y el transporte serial sin hardware.
+# Responde a los mismos comandos que el sketch, incluido el modo streaming (stream:<hz>).
+# Uso:
+#   python arduino_falso.py            -> imprime la ruta del puerto, p. ej. /dev/pts/5
+#   PUERTO_SERIAL=/dev/pts/5 python main.py
+
+RESPUESTAS = {
+    "modo1": "Modo 1 activo: LED encendido",
+    "modo2": "Modo 2 activo: LED apagado",
+    "modo4": "Modo 4 activo: RGB encendido y animando",
+    "modo5": "Modo 5 activo: RGB apagado",
+    "modo6": "Modo 6 activo: Sensor de ruido activado",
+    "modo7": "Modo 7 activo: Sensor de ruido desactivado",
+    "modo8": "Modo 8 activo: Sensor de llama activado",
+    "modo9": "Modo 9 activo: Sensor de llama desactivado",
+}
+
+
+def responder(comando, estado, demora):
+    if demora:
+        select.select([], [], [], demora)
+    if comando == "modo3":
+        return f"{random.gauss(22.5, 0.4):.2f}"
+    if comando in ("modo6", "modo7"):
+        estado["ruido"] = comando == "modo6"
+    if comando.startswith("stream:"):
+        hz = min(int(comando[7:]) if comando[7:].isdigit() else 0, 90)
+        estado["stream_hz"] = max(hz, 0)
+        estado["simulador"] = SimuladorTramas()
+        estado["proxima_trama"] = time.monotonic()
+        return f"Stream activo: {hz} Hz" if hz > 0 else "Stream detenido"
+    return RESPUESTAS.get(comando, "Comando no reconocido")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simula el sketch sensor_temperatura_ky028 en un pty")
+    parser.add_argument("--demora", type=float, default=0.05, help="Segundos que tarda cada respuesta")
+    parser.add_argument("--intervalo-ruido", type=float, default=0.5, help="Cada cuánto se imprime el nivel de ruido con el modo 6")
+    args = parser.parse_args()
+
+    maestro, esclavo = os.openpty()
+    tty.setraw(esclavo)
+    print(os.ttyname(esclavo), flush=True)
+
+    estado = {"ruido": False, "stream_hz": 0}
+    buffer = b""
+    while True:
+        espera = args.intervalo_ruido
+        if estado["stream_hz"]:
+            espera = max(0.0, estado["proxima_trama"] - time.monotonic())
+        legibles, _, _ = select.select([maestro], [], [], espera)
+        if estado["stream_hz"] and time.monotonic() >= estado["proxima_trama"]:
+            # Modo streaming: tramas binarias como las de enviarTrama() en el sketch
+            os.write(maestro, estado["simulador"].trama())
+            estado["proxima_trama"] += 1 / estado["stream_hz"]
+        if not legibles:
+            # Igual que el sketch: con el modo 6 activo el nivel de ruido se imprime continuamente
+            if estado["ruido"]:
+                os.write(maestro, f"Nivel de ruido analógico: {random.randint(300, 900)}\r\n".encode("utf-8"))
+            continue
+        buffer += os.read(maestro, 1024)
+        *lineas, buffer = buffer.split(b"\n")
+        for linea in lineas:
+            comando = linea.decode("utf-8", errors="replace").strip()
+            if comando:
+                os.write(maestro, (responder(comando, estado, args.demora) + "\r\n").encode("utf-8"))
+
+
+if __name__ == "__main__":
+    main()
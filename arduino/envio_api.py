@@ -0,0 +1,253 @@
+import asyncio
+import gzip
+import json
+import logging
+import random
+import sqlite3
+import time
+import httpx
+
+# Envío de lecturas a la API con almacenamiento local ("store and forward").
+# Cada lectura se guarda primero en SQLite (se agrupan en memoria hasta INTERVALO_GUARDADO para no hacer un
+# commit por lectura) y después se envía en lotes comprimidos con gzip a POST /sensor-data/batch;
+# si la API no responde se reintenta con backoff exponencial y nada se pierde.
+# Al reconectar se vacía el atraso enviando lotes seguidos, sin esperar entre uno y otro.
+# Los lotes que la API rechaza de forma permanente (4xx) pasan a la tabla "descartadas" para no trabar la cola;
+# se vuelven a encolar con `python main.py --recuperar-descartadas`.
+
+TAMANO_LOTE = 500  # Lecturas por envío; al juntar este número se envía sin esperar
+EDAD_MAXIMA = 10.0  # Segundos que puede esperar la lectura más antigua antes de enviarse
+BACKOFF_MINIMO = 1.0
+BACKOFF_MAXIMO = 300.0
+INTERVALO_GUARDADO = 1.0  # Segundos entre escrituras a SQLite: las lecturas se juntan en memoria y se guardan en una sola transacción
+# Respuestas que se reintentan; cualquier otro error 4xx es permanente.
+# 401/403 también: una clave vencida o cambiada no debe mandar toda la cola a "descartadas"
+ESTADOS_REINTENTABLES = {401, 403, 408, 429}
+ESTADOS_CLAVE_RECHAZADA = {401, 403}
+
+
+# Las fechas se guardan en ISO 8601, que es lo que espera SensorData.timestamp
+def _serializar(valor):
+    if hasattr(valor, "isoformat"):
+        return valor.isoformat()
+    raise TypeError(f"No se puede serializar {type(valor).__name__}")
+
+
+# Cola durable en SQLite: las lecturas sobreviven a cortes de red y reinicios del bot
+class ColaLecturas:
+    def __init__(self, ruta: str):
+        self.conexion = sqlite3.connect(ruta)
+        self.conexion.execute("PRAGMA journal_mode=WAL")
+        self.conexion.execute(
+            "CREATE TABLE IF NOT EXISTS pendientes ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, lectura TEXT NOT NULL, creada REAL NOT NULL)"
+        )
+        self.conexion.execute(
+            "CREATE TABLE IF NOT EXISTS descartadas ("
+            "id INTEGER PRIMARY KEY, lectura TEXT NOT NULL, creada REAL NOT NULL, motivo TEXT NOT NULL, descartada REAL NOT NULL)"
+        )
+        self.conexion.commit()
+
+    # Guarda [(lectura, creada)] en una sola transacción
+    def agregar(self, lecturas):
+        with self.conexion:
+            self.conexion.executemany(
+                "INSERT INTO pendientes (lectura, creada) VALUES (?, ?)",
+                [(json.dumps(lectura, default=_serializar), creada) for lectura, creada in lecturas],
+            )
+
+    # Las `cantidad` lecturas más antiguas como [(id, lectura_json)]
+    def siguientes(self, cantidad: int):
+        return self.conexion.execute(
+            "SELECT id, lectura FROM pendientes ORDER BY id LIMIT ?", (cantidad,)
+        ).fetchall()
+
+    def confirmar(self, ultimo_id: int):
+        with self.conexion:
+            self.conexion.execute("DELETE FROM pendientes WHERE id <= ?", (ultimo_id,))
+
+    # Mueve las lecturas pendientes hasta `ultimo_id` a "descartadas", guardando el motivo
+    def descartar(self, ultimo_id: int, motivo: str):
+        with self.conexion:
+            self.conexion.execute(
+                "INSERT INTO descartadas (id, lectura, creada, motivo, descartada) "
+                "SELECT id, lectura, creada, ?, ? FROM pendientes WHERE id <= ?",
+                (motivo, time.time(), ultimo_id),
+            )
+            self.conexion.execute("DELETE FROM pendientes WHERE id <= ?", (ultimo_id,))
+
+    # Vuelve a encolar las lecturas descartadas (p. ej. después de corregir la API_KEY); devuelve cuántas
+    def recuperar_descartadas(self) -> int:
+        with self.conexion:
+            cursor = self.conexion.execute(
+                "INSERT INTO pendientes (lectura, creada) SELECT lectura, creada FROM descartadas ORDER BY id"
+            )
+            self.conexion.execute("DELETE FROM descartadas")
+        return cursor.rowcount
+
+    # Solo se borran prefijos de ids consecutivos, así que max - min + 1 es la cantidad sin recorrer la tabla
+    def cantidad(self) -> int:
+        minimo, maximo = self.conexion.execute("SELECT MIN(id), MAX(id) FROM pendientes").fetchone()
+        return maximo - minimo + 1 if minimo is not None else 0
+
+    # Antigüedad en segundos de la lectura pendiente más vieja (0 si no hay)
+    def antiguedad(self) -> float:
+        fila = self.conexion.execute("SELECT creada FROM pendientes ORDER BY id LIMIT 1").fetchone()
+        return time.time() - fila[0] if fila else 0.0
+
+    def cerrar(self):
+        self.conexion.close()
+
+
+class EnviadorLecturas:
+    def __init__(self, url_api: str, api_key: str, ruta_cola: str = "lecturas_pendientes.db",
+                 tamano_lote: int = TAMANO_LOTE, edad_maxima: float = EDAD_MAXIMA,
+                 backoff_minimo: float = BACKOFF_MINIMO, backoff_maximo: float = BACKOFF_MAXIMO,
+                 obtener_api_key=None):
+        self.url = url_api.rstrip("/") + "/sensor-data/batch"
+        self.api_key = api_key
+        # Función que devuelve la clave vigente; se vuelve a leer cuando la API rechaza la actual
+        self.obtener_api_key = obtener_api_key
+        self.cola = ColaLecturas(ruta_cola)
+        self.tamano_lote = tamano_lote
+        self.edad_maxima = edad_maxima
+        self.backoff_minimo = backoff_minimo
+        self.backoff_maximo = backoff_maximo
+        self.enviadas = 0
+        self.rechazadas = 0
+        self.descartadas = 0
+        self._hay_lote = asyncio.Event()
+        self._cliente = None
+        # Lecturas todavía no guardadas en SQLite: (lectura, creada)
+        self._memoria = []
+
+    # Agrega la lectura a la memoria; nunca espera a la red ni al disco
+    def agregar(self, lectura: dict):
+        self._memoria.append((lectura, time.time()))
+        if len(self._memoria) >= self.tamano_lote:
+            self._hay_lote.set()
+
+    # Pasa las lecturas en memoria a SQLite (un commit por llamada)
+    def guardar(self):
+        if self._memoria:
+            lecturas, self._memoria = self._memoria, []
+            self.cola.agregar(lecturas)
+
+    def _cuerpo(self, filas) -> bytes:
+        ndjson = "\n".join(lectura for _, lectura in filas).encode("utf-8")
+        return gzip.compress(ndjson)
+
+    # Envía un lote. Devuelve True si la API lo aceptó o si lo rechazó de forma permanente
+    # (en ese caso queda en "descartadas"), y False si hay que reintentarlo más tarde
+    async def _enviar_lote(self, filas) -> bool:
+        try:
+            respuesta = await self._cliente.post(
+                self.url,
+                content=self._cuerpo(filas),
+                headers={
+                    "x-api-key": self.api_key,
+                    "Content-Type": "application/x-ndjson",
+                    "Content-Encoding": "gzip",
+                },
+            )
+        except httpx.HTTPError as e:
+            logging.warning(f"No se pudo contactar la API: {e}")
+            return False
+        estado = respuesta.status_code
+        if estado in ESTADOS_CLAVE_RECHAZADA:
+            self._renovar_api_key()
+        if estado >= 500 or estado in ESTADOS_REINTENTABLES:
+            logging.warning(f"La API respondió {estado} al enviar {len(filas)} lecturas; se reintentará")
+            return False
+        if estado >= 300:
+            # Clave inválida, lote mal formado o demasiado grande: reintentarlo trabaría toda la cola
+            logging.error(f"La API rechazó un lote de {len(filas)} lecturas con {estado}; se mueve a 'descartadas'")
+            self.cola.descartar(filas[-1][0], f"HTTP {estado}: {respuesta.text[:200]}")
+            self.descartadas += len(filas)
+            return True
+
+        # Las filas rechazadas por validación no se reintentan: volverían a fallar
+        try:
+            rechazadas = respuesta.json().get("rejected", [])
+        except (ValueError, AttributeError):
+            logging.warning(f"Respuesta {estado} sin JSON válido; el lote se da por enviado")
+            rechazadas = []
+        self.cola.confirmar(filas[-1][0])
+        if rechazadas:
+            logging.warning(f"La API rechazó {len(rechazadas)} lecturas: {rechazadas[:5]}")
+        self.enviadas += len(filas) - len(rechazadas)
+        self.rechazadas += len(rechazadas)
+        return True
+
+    def _renovar_api_key(self):
+        if self.obtener_api_key is None:
+            logging.error("La API rechazó la clave; se reintentará con la misma")
+            return
+        try:
+            nueva = self.obtener_api_key()
+        except Exception:
+            logging.exception("No se pudo leer la clave de la API")
+            return
+        if nueva and nueva != self.api_key:
+            logging.info("La API rechazó la clave; se usa la clave actualizada")
+            self.api_key = nueva
+        else:
+            logging.error("La API rechazó la clave y no hay una nueva; se reintentará")
+
+    # Envía lotes mientras haya lecturas pendientes; devuelve False si la API falló
+    async def vaciar(self) -> bool:
+        while True:
+            filas = self.cola.siguientes(self.tamano_lote)
+            if not filas:
+                return True
+            if not await self._enviar_lote(filas):
+                return False
+
+    # Una vuelta del envío: espera a juntar un lote o a que venza la edad máxima (guardando en SQLite
+    # cada INTERVALO_GUARDADO) y envía; devuelve el backoff para la vuelta siguiente
+    async def _ciclo(self, backoff: float) -> float:
+        espera = max(0.0, self.edad_maxima - self.cola.antiguedad()) if self.cola.cantidad() else self.edad_maxima
+        try:
+            await asyncio.wait_for(self._hay_lote.wait(), timeout=min(espera, INTERVALO_GUARDADO))
+        except asyncio.TimeoutError:
+            pass
+        self._hay_lote.clear()
+        self.guardar()
+
+        if not self.cola.cantidad() or (
+            self.cola.cantidad() < self.tamano_lote and self.cola.antiguedad() < self.edad_maxima
+        ):
+            return backoff
+
+        if await self.vaciar():
+            return self.backoff_minimo
+
+        # Backoff exponencial con jitter mientras la API no esté disponible
+        pendientes = self.cola.cantidad()
+        logging.info(f"Reintentando en {backoff:.0f} s ({pendientes} lecturas pendientes)")
+        await asyncio.sleep(backoff * random.uniform(0.5, 1.0))
+        self._hay_lote.set()
+        return min(backoff * 2, self.backoff_maximo)
+
+    # Tarea principal. Un error inesperado (SQLite, respuesta rara de la API) se registra y el envío sigue:
+    # la tarea corre sin que nadie la espere, así que si terminara se dejaría de subir lecturas en silencio
+    async def ejecutar(self):
+        backoff = self.backoff_minimo
+        async with httpx.AsyncClient(timeout=30) as cliente:
+            self._cliente = cliente
+            while True:
+                try:
+                    backoff = await self._ciclo(backoff)
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    logging.exception("Error en el envío de lecturas; se reintenta")
+                    await asyncio.sleep(backoff * random.uniform(0.5, 1.0))
+                    backoff = min(backoff * 2, self.backoff_maximo)
+
+    # Guarda lo que quedó en memoria antes de cerrar la cola
+    def cerrar(self):
+        try:
+            self.guardar()
+        finally:
+            self.cola.cerrar()
@@ -1,20 +1,29 @@
-import serial
-import time
+import os
 import logging
+import tempfile
 import asyncio
 import pandas as pd
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ApplicationBuilder, CommandHandler, CallbackQueryHandler, ContextTypes
+from transporte_serial import ArduinoSerial
+from envio_api import ColaLecturas, EnviadorLecturas
 
 # Configurar la conexión serial con Arduino
-ser = serial.Serial('COM3', 9600, timeout=1)  # Cambia 'COM3' al puerto correcto si es necesario
-time.sleep(2)  # Esperar un poco para que la conexión se establezca
+PUERTO_SERIAL = os.getenv("PUERTO_SERIAL", "COM3")  # Cambia 'COM3' al puerto correcto si es necesario
+arduino = None  # Transporte serial asíncrono; se abre en main()
+
+# Envío de las lecturas a la API (si no se configura API_URL solo se guardan en Excel)
+API_URL = os.getenv("API_URL")
+API_KEY = os.getenv("API_KEY", "")
+API_KEY_ARCHIVO = os.getenv("API_KEY_ARCHIVO")  # Si se define, la clave se lee de este archivo (se puede cambiar sin reiniciar)
+COLA_LECTURAS = os.getenv("COLA_LECTURAS", "lecturas_pendientes.db")  # Cola local para no perder lecturas sin red
+ID_DISPOSITIVO = os.getenv("ID_DISPOSITIVO")  # Identifica a esta placa en la API (device_id)
+enviador = None
 
 # Configuración inicial de medición
 tiempo_total = 5  # Tiempo total en minutos (valor inicial)
 intervalo_medicion = 30  # Intervalo en segundos (valor inicial)
-mediciones = []  # Lista para almacenar las mediciones
 medidor_sonido_activo = False  # Estado del medidor de sonido
 medidor_llama_activo = False  # Estado del medidor de llama
 umbral_sonido = 800  # Umbral para el sensor de ruido
@@ -25,15 +34,19 @@ logging.basicConfig(
     level=logging.INFO
 )
 
-# Función para enviar comandos al Arduino
-def enviar_comando_arduino(comando):
-    comando_con_salto = comando + '\n'
-    ser.write(comando_con_salto.encode('utf-8'))
-    time.sleep(1)
-    while ser.in_waiting > 0:
-        respuesta = ser.readline().decode('utf-8').rstrip()
-        return respuesta
-    return "Comando enviado, esperando respuesta del Arduino..."
+# Clave vigente de la API: la del archivo API_KEY_ARCHIVO si existe, o la variable de entorno
+def leer_api_key():
+    if API_KEY_ARCHIVO:
+        with open(API_KEY_ARCHIVO, encoding="utf-8") as f:
+            return f.read().strip()
+    return API_KEY
+
+# Función para enviar comandos al Arduino sin bloquear el bot
+async def enviar_comando_arduino(comando):
+    try:
+        return await arduino.enviar(comando)
+    except asyncio.TimeoutError:
+        return "Comando enviado, esperando respuesta del Arduino..."
 
 # Funciones para manejar los comandos de Telegram
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -74,13 +87,13 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 
     if query.data == 'modo1':
         logging.info("Botón 'Encender LED' presionado")
-        respuesta = enviar_comando_arduino("modo1")
+        respuesta = await enviar_comando_arduino("modo1")
         await query.edit_message_text(text=f"Encender LED: {respuesta}")
         await mostrar_menu(query)
 
     elif query.data == 'modo2':
         logging.info("Botón 'Apagar LED' presionado")
-        respuesta = enviar_comando_arduino("modo2")
+        respuesta = await enviar_comando_arduino("modo2")
         await query.edit_message_text(text=f"Apagar LED: {respuesta}")
         await mostrar_menu(query)
 
@@ -97,7 +110,7 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 
     elif query.data == 'medir_instantaneo':
         logging.info("Botón 'Medir al Instante' presionado")
-        respuesta = enviar_comando_arduino("modo3")
+        respuesta = await enviar_comando_arduino("modo3")
         await query.message.reply_text(text=f"Temperatura: {respuesta} *C")
         await mostrar_menu(query)
 
@@ -127,17 +140,18 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     elif query.data == 'confirmar_intervalo':
         logging.info(f"Tiempo total: {tiempo_total} min, Intervalo: {intervalo_medicion} seg")
         await query.edit_message_text(text=f"Tiempo total configurado: {tiempo_total} min, Intervalo configurado: {intervalo_medicion} segundos")
-        await realizar_medicion_por_intervalo(query)
+        # La medición dura varios minutos: se ejecuta en segundo plano para no retener el handler
+        context.application.create_task(realizar_medicion_por_intervalo(query))
 
     elif query.data == 'modo4':
         logging.info("Botón 'Encender LED RGB' presionado")
-        respuesta = enviar_comando_arduino("modo4")
+        respuesta = await enviar_comando_arduino("modo4")
         await query.message.reply_text(text=f"Encender LED RGB: {respuesta}")
         await mostrar_menu(query)
 
     elif query.data == 'modo5':
         logging.info("Botón 'Apagar LED RGB' presionado")
-        respuesta = enviar_comando_arduino("modo5")
+        respuesta = await enviar_comando_arduino("modo5")
         await query.message.reply_text(text=f"Apagar LED RGB: {respuesta}")
         await mostrar_menu(query)
 
@@ -156,7 +170,7 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         medidor_sonido_activo = not medidor_sonido_activo
         estado = "activado" if medidor_sonido_activo else "desactivado"
         logging.info(f"Medidor de sonido {estado}")
-        respuesta = enviar_comando_arduino("modo6" if medidor_sonido_activo else "modo7")
+        respuesta = await enviar_comando_arduino("modo6" if medidor_sonido_activo else "modo7")
         logging.info(f"Respuesta de Arduino: {respuesta}")
         await query.message.reply_text(text=f"Medidor de sonido {estado}: {respuesta}. Estado RGB: {'Rojo' if medidor_sonido_activo else 'Verde'}")
         await mostrar_menu(query)
@@ -165,7 +179,7 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         medidor_llama_activo = not medidor_llama_activo
         estado = "activado" if medidor_llama_activo else "desactivado"
         logging.info(f"Medidor de llama {estado}")
-        respuesta = enviar_comando_arduino("modo8" if medidor_llama_activo else "modo9")
+        respuesta = await enviar_comando_arduino("modo8" if medidor_llama_activo else "modo9")
         logging.info(f"Respuesta de Arduino: {respuesta}")
         await query.message.reply_text(text=f"Medidor de llama {estado}: {respuesta}. Estado RGB: {'Rojo' if medidor_llama_activo else 'Verde'}")
         await mostrar_menu(query)
@@ -175,24 +189,24 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         await mostrar_configurar_umbral(query)
     elif query.data == 'incrementar_umbral':
         umbral_sonido += 10
-        enviar_comando_arduino(f"umbral_sonido:{umbral_sonido}")
+        await enviar_comando_arduino(f"umbral_sonido:{umbral_sonido}")
         await mostrar_configurar_umbral(query)
 
     elif query.data == 'decrementar_umbral':
         if umbral_sonido > 10:
             umbral_sonido -= 10
-            enviar_comando_arduino(f"umbral_sonido:{umbral_sonido}")
+            await enviar_comando_arduino(f"umbral_sonido:{umbral_sonido}")
         await mostrar_configurar_umbral(query)
 
     elif query.data == 'incrementar_umbral_1':
         umbral_sonido += 1
-        enviar_comando_arduino(f"umbral_sonido:{umbral_sonido}")
+        await enviar_comando_arduino(f"umbral_sonido:{umbral_sonido}")
         await mostrar_configurar_umbral(query)
 
     elif query.data == 'decrementar_umbral_1':
         if umbral_sonido > 1:
             umbral_sonido -= 1
-            enviar_comando_arduino(f"umbral_sonido:{umbral_sonido}")
+            await enviar_comando_arduino(f"umbral_sonido:{umbral_sonido}")
         await mostrar_configurar_umbral(query)
 
 
@@ -238,7 +252,7 @@ async def mostrar_configurar_umbral(query):
 
 # Función para realizar la medición por intervalos
 async def realizar_medicion_por_intervalo(query):
-    global tiempo_total, intervalo_medicion, mediciones
+    global tiempo_total, intervalo_medicion
 
     if tiempo_total == 0 or intervalo_medicion == 0:
         await query.message.reply_text(text="Por favor configura primero el tiempo total y el intervalo de medición.")
@@ -247,12 +261,13 @@ async def realizar_medicion_por_intervalo(query):
     total_iteraciones = (tiempo_total * 60) // intervalo_medicion
     suma_temperaturas = 0.0
     iteraciones_validas = 0
-    mediciones = []  # Limpiar las mediciones previas
+    mediciones = []  # Mediciones de esta sesión (puede haber varias en paralelo)
     tiempo_inicio = datetime.now()
 
     for i in range(total_iteraciones):
-        respuesta = enviar_comando_arduino("modo3")
-        tiempo_actual = datetime.now()
+        respuesta = await enviar_comando_arduino("modo3")
+        # Hora local con su zona: se muestra local al usuario y la API la guarda como UTC correctamente
+        tiempo_actual = datetime.now().astimezone()
         tiempo_transcurrido = str(timedelta(seconds=(i + 1) * intervalo_medicion))
         hora_actual = tiempo_actual.strftime("%H:%M:%S")
 
@@ -266,6 +281,8 @@ async def realizar_medicion_por_intervalo(query):
                 'Tiempo Transcurrido': tiempo_transcurrido,
                 'Hora de Medición': hora_actual
             })
+            if enviador:
+                enviador.agregar({"temperature": temperatura, "noise": None, "timestamp": tiempo_actual, "device_id": ID_DISPOSITIVO})
             await query.message.reply_text(text=f"Medición {iteraciones_validas}: Temperatura = {temperatura:.2f} *C, Tiempo Transcurrido = {tiempo_transcurrido}, Hora de Medición = {hora_actual}")
         except ValueError:
             await query.message.reply_text(text=f"Error al leer la temperatura en la iteración {i + 1}")
@@ -275,31 +292,46 @@ async def realizar_medicion_por_intervalo(query):
     if iteraciones_validas > 0:
         promedio = suma_temperaturas / iteraciones_validas
         await query.message.reply_text(text=f"Mediciones completadas. Promedio de temperatura: {promedio:.2f} *C")
-        await generar_excel(query, promedio)
+        await generar_excel(query, promedio, mediciones)
     else:
         await query.message.reply_text(text="No se pudieron obtener mediciones válidas.")
     
     await mostrar_menu(query)
 
 # Función para generar y enviar el archivo Excel con las mediciones
-async def generar_excel(query, promedio):
-    global mediciones
-
+async def generar_excel(query, promedio, mediciones):
     # Crear un DataFrame con las mediciones y el promedio
     df = pd.DataFrame(mediciones)
     df.loc[len(df.index)] = ['Promedio', promedio, '', '']  # Añadir el promedio al final
 
-    # Guardar el DataFrame como un archivo Excel
+    # Guardar el DataFrame como un archivo Excel propio de esta medición (puede haber varias en paralelo),
+    # en un hilo para no bloquear el bot mientras se escribe
     nombre_archivo = 'mediciones_temperatura.xlsx'
-    df.to_excel(nombre_archivo, index=False)
+    with tempfile.TemporaryDirectory() as carpeta:
+        ruta = os.path.join(carpeta, nombre_archivo)
+        await asyncio.to_thread(df.to_excel, ruta, index=False)
 
-    # Enviar el archivo Excel al usuario de Telegram
-    with open(nombre_archivo, 'rb') as f:
-        await query.message.reply_document(document=f, filename=nombre_archivo)
+        # Enviar el archivo Excel al usuario de Telegram
+        with open(ruta, 'rb') as f:
+            await query.message.reply_document(document=f, filename=nombre_archivo)
+
+# Reenvía a la API las lecturas que llegan del modo streaming del Arduino
+async def reenviar_tramas():
+    while True:
+        lectura = await arduino.tramas.get()
+        enviador.agregar({"temperature": lectura.temperatura, "noise": lectura.ruido, "timestamp": datetime.now(timezone.utc), "device_id": ID_DISPOSITIVO})
 
 async def main() -> None:
+    global arduino, enviador
+
     TOKEN = ""
-    application = ApplicationBuilder().token(TOKEN).build()
+    arduino = await ArduinoSerial.abrir(PUERTO_SERIAL, 9600)
+    tareas = []
+    if API_URL:
+        enviador = EnviadorLecturas(API_URL, leer_api_key(), COLA_LECTURAS, obtener_api_key=leer_api_key)
+        tareas = [asyncio.create_task(enviador.ejecutar()), asyncio.create_task(reenviar_tramas())]
+    # concurrent_updates: los botones de un usuario no esperan a que termine el handler de otro
+    application = ApplicationBuilder().token(TOKEN).concurrent_updates(True).build()
 
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CallbackQueryHandler(button_handler))
@@ -317,11 +349,31 @@ async def main() -> None:
 
     await application.stop()
     await application.shutdown()
+    for tarea in tareas:
+        tarea.cancel()
+    await arduino.cerrar()
+    if enviador:
+        enviador.cerrar()
+
+# Vuelve a encolar los lotes que la API rechazó (p. ej. después de corregir la clave) y termina
+def recuperar_descartadas():
+    cola = ColaLecturas(COLA_LECTURAS)
+    try:
+        print(f"Lecturas recuperadas: {cola.recuperar_descartadas()}")
+    finally:
+        cola.cerrar()
 
 if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Bot de Telegram del sensor")
+    parser.add_argument("--recuperar-descartadas", action="store_true",
+                        help="Vuelve a encolar las lecturas descartadas por la API y termina")
+    args = parser.parse_args()
+    if args.recuperar_descartadas:
+        recuperar_descartadas()
+        raise SystemExit(0)
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
         print("Finalizando...")
-    finally:
-        ser.close()
@@ -0,0 +1,180 @@
+import argparse
+import random
+import struct
+import time
+from collections import namedtuple
+
+# Protocolo binario del modo streaming del sketch (comando "stream:<hz>", "stream:0" lo detiene).
+# Cada trama ocupa 10 bytes:
+#   0xAA 0x55 | secuencia uint16 | temperatura int16 (centésimas de °C) | ruido uint16 (A1, 0-1023) | llama uint8 | CRC-8
+# Los enteros van en little-endian (el orden nativo del AVR) y el CRC-8 (polinomio 0x07) cubre los 7 bytes de datos.
+
+SYNC = b"\xaa\x55"
+FORMATO_DATOS = struct.Struct("<HhHB")
+TAMANO_TRAMA = len(SYNC) + FORMATO_DATOS.size + 1
+MAX_LINEA = 256  # Bytes de una línea de texto a medio recibir que se guardan como máximo
+
+Lectura = namedtuple("Lectura", ["secuencia", "temperatura", "ruido", "llama"])
+
+
+def _tabla_crc8(polinomio=0x07):
+    tabla = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ polinomio) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        tabla.append(crc)
+    return bytes(tabla)
+
+_TABLA_CRC8 = _tabla_crc8()
+
+
+def crc8(datos) -> int:
+    crc = 0
+    for byte in datos:
+        crc = _TABLA_CRC8[crc ^ byte]
+    return crc
+
+
+def codificar_trama(secuencia: int, temperatura: float, ruido: int, llama: int) -> bytes:
+    datos = FORMATO_DATOS.pack(secuencia & 0xFFFF, round(temperatura * 100), ruido, llama)
+    return SYNC + datos + bytes([crc8(datos)])
+
+
+# Decodificador incremental: recibe los bytes tal como llegan del puerto y devuelve las tramas completas.
+# Los bytes que no forman una trama válida (texto de las respuestas, basura, tramas corruptas) se
+# descartan byte a byte hasta volver a encontrar la sincronización; el texto se devuelve separado en líneas.
+# El sketch nunca escribe una trama en medio de una línea, así que al encontrar una cabecera la línea a medio
+# armar es basura y se descarta; de las líneas solo queda texto (UTF-8 válido sin caracteres de control).
+class DecodificadorTramas:
+    def __init__(self):
+        self._buffer = b""
+        self._texto = bytearray()
+        # Bytes del principio de _buffer que son resto de una trama corrupta: se revisan buscando
+        # sincronización pero no pasan al texto
+        self._sin_texto = 0
+        self._ultima_secuencia = None
+        self.tramas = 0
+        self.errores_crc = 0
+        self.tramas_perdidas = 0
+        self.bytes_fuera_de_trama = 0
+
+    # Devuelve (lecturas, lineas_de_texto) con lo que se pudo decodificar hasta ahora
+    def alimentar(self, datos: bytes):
+        buffer = self._buffer + datos
+        lecturas = []
+        texto = self._texto
+        sin_texto = self._sin_texto
+        i = 0
+        while True:
+            j = buffer.find(SYNC, i)
+            if j < 0:
+                # Si el último byte puede ser el inicio de una sincronización, se conserva
+                fin = len(buffer) - 1 if buffer.endswith(SYNC[:1]) else len(buffer)
+                self._fuera(texto, buffer, i, fin, sin_texto)
+                i = fin
+                break
+            self._fuera(texto, buffer, i, j, sin_texto)
+            if len(buffer) - j < TAMANO_TRAMA:
+                i = j
+                break
+            del texto[texto.rfind(b"\n") + 1:]
+            datos_trama = buffer[j + 2:j + TAMANO_TRAMA - 1]
+            if crc8(datos_trama) != buffer[j + TAMANO_TRAMA - 1]:
+                # Ni la cabecera ni el resto de la trama pasan al texto; se sigue buscando después de la cabecera
+                self.errores_crc += 1
+                self.bytes_fuera_de_trama += len(SYNC)
+                i = j + len(SYNC)
+                sin_texto = max(sin_texto, j + TAMANO_TRAMA)
+                continue
+            lecturas.append(self._lectura(datos_trama))
+            i = j + TAMANO_TRAMA
+        self._buffer = buffer[i:]
+        self._sin_texto = max(0, sin_texto - i)
+        return lecturas, self._lineas()
+
+    # Pasa al texto los bytes buffer[inicio:fin] fuera de trama, salvo los anteriores a `sin_texto`
+    def _fuera(self, texto: bytearray, buffer: bytes, inicio: int, fin: int, sin_texto: int):
+        self.bytes_fuera_de_trama += fin - inicio
+        texto += buffer[max(inicio, sin_texto):fin]
+
+    def _lectura(self, datos_trama) -> Lectura:
+        secuencia, temperatura, ruido, llama = FORMATO_DATOS.unpack(datos_trama)
+        if self._ultima_secuencia is not None:
+            self.tramas_perdidas += (secuencia - self._ultima_secuencia - 1) & 0xFFFF
+        self._ultima_secuencia = secuencia
+        self.tramas += 1
+        return Lectura(secuencia, temperatura / 100, ruido, llama)
+
+    def _lineas(self):
+        *lineas, resto = self._texto.split(b"\n")
+        # Sin salto de línea durante tanto tiempo no es texto del sketch: no se deja crecer el buffer
+        self._texto = bytearray(resto) if len(resto) <= MAX_LINEA else bytearray()
+        return [linea for linea in map(_texto_limpio, lineas) if linea]
+
+
+# Deja solo el texto de una línea: descarta bytes que no forman UTF-8 válido (basura, restos de tramas)
+# y caracteres de control
+def _texto_limpio(linea: bytes) -> str:
+    texto = linea.decode("utf-8", errors="ignore")
+    return "".join(c for c in texto if c.isprintable() or c == "\t").strip()
+
+
+# Genera el flujo de bytes que enviaría el sketch, opcionalmente con basura y tramas corruptas intercaladas
+class SimuladorTramas:
+    def __init__(self, semilla: int = 0, prob_basura: float = 0.0, prob_corrupcion: float = 0.0):
+        self.random = random.Random(semilla)
+        self.prob_basura = prob_basura
+        self.prob_corrupcion = prob_corrupcion
+        self.secuencia = 0
+
+    def trama(self) -> bytes:
+        trama = codificar_trama(
+            self.secuencia,
+            self.random.gauss(22.5, 0.5),
+            self.random.randint(200, 900),
+            1 if self.random.random() < 0.01 else 0,
+        )
+        self.secuencia = (self.secuencia + 1) & 0xFFFF
+        if self.random.random() < self.prob_corrupcion:
+            posicion = self.random.randrange(2, TAMANO_TRAMA)
+            trama = trama[:posicion] + bytes([trama[posicion] ^ 0xFF]) + trama[posicion + 1:]
+        if self.random.random() < self.prob_basura:
+            trama = bytes(self.random.randrange(256) for _ in range(self.random.randint(1, 20))) + trama
+        return trama
+
+    def flujo(self, cantidad: int) -> bytes:
+        return b"".join(self.trama() for _ in range(cantidad))
+
+
+# Benchmark sin hardware: decodifica `tramas` tramas simuladas entregadas en trozos de tamaño aleatorio
+def medir_rendimiento(tramas: int, prob_basura: float, prob_corrupcion: float, semilla: int = 0):
+    flujo = SimuladorTramas(semilla, prob_basura, prob_corrupcion).flujo(tramas)
+    rng = random.Random(semilla)
+    decodificador = DecodificadorTramas()
+    inicio = time.perf_counter()
+    posicion = 0
+    while posicion < len(flujo):
+        tamano = rng.randint(1, 256)
+        decodificador.alimentar(flujo[posicion:posicion + tamano])
+        posicion += tamano
+    duracion = time.perf_counter() - inicio
+    return {
+        "tramas_enviadas": tramas,
+        "tramas_decodificadas": decodificador.tramas,
+        "errores_crc": decodificador.errores_crc,
+        "tramas_perdidas": decodificador.tramas_perdidas,
+        "segundos": round(duracion, 3),
+        "tramas_por_segundo": round(decodificador.tramas / duracion) if duracion else 0,
+        "megabytes_por_segundo": round(len(flujo) / duracion / 1e6, 2) if duracion else 0,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mide el decodificador de tramas con datos simulados")
+    parser.add_argument("--tramas", type=int, default=200_000)
+    parser.add_argument("--basura", type=float, default=0.01, help="Probabilidad de bytes basura antes de cada trama")
+    parser.add_argument("--corrupcion", type=float, default=0.001, help="Probabilidad de corromper una trama")
+    args = parser.parse_args()
+    for clave, valor in medir_rendimiento(args.tramas, args.basura, args.corrupcion).items():
+        print(f"{clave}: {valor}")
@@ -27,6 +27,15 @@ bool llamaActivo = false; // Variable para saber si el modo de sensor de llama e
 int umbralRuido = 800; // Umbral de nivel de ruido para activar el buzzer
 int umbralLlama = 1;   // Umbral para el sensor de llama (1 indica que se detecta fuego)
 
+// Modo streaming: tramas binarias periódicas con temperatura, ruido (A1) y llama
+// Trama de 10 bytes: 0xAA 0x55 | secuencia uint16 | temperatura int16 (centésimas de °C) | ruido uint16 | llama uint8 | CRC-8
+// Los enteros van en little-endian; el decodificador está en arduino/protocolo.py
+#define STREAM_MAX_HZ 90 // A 9600 baudios caben ~96 tramas de 10 bytes por segundo
+bool streamActivo = false;      // Variable para saber si el modo streaming está activo
+unsigned long periodoStream = 100; // Milisegundos entre tramas
+unsigned long ultimaTrama = 0;  // millis() de la última trama enviada
+uint16_t secuenciaStream = 0;   // Número de secuencia para detectar tramas perdidas
+
 void setup() {
     Serial.begin(9600);          // Inicialización de la comunicación serial
     pinMode(ledPin, OUTPUT);     // Configuración del LED como salida
@@ -62,22 +71,8 @@ void loop() {
             Serial.println("Modo 2 activo: LED apagado");
         } 
         else if (comando == "modo3") {
-            // Modo 3: Leer la temperatura del sensor NTC y enviarla por el puerto serial
-            float ADCvalue = analogRead(NTCPin);
-            float voltage = (ADCvalue * 5.0) / 1023.0;
-            float resistance = (5.0 * SERIESRESISTOR / voltage) - SERIESRESISTOR;
-
-            // Cálculo de la temperatura con Steinhart-Hart
-            float steinhart;
-            steinhart = resistance / NOMINAL_RESISTANCE;
-            steinhart = log(steinhart);
-            steinhart /= BCOEFFICIENT;
-            steinhart += 1.0 / (NOMINAL_TEMPERATURE + 273.15);
-            steinhart = 1.0 / steinhart;
-            steinhart -= 273.15;
-
-            // Enviar solo el valor numérico de la temperatura
-            Serial.println(steinhart);
+            // Modo 3: Leer la temperatura del sensor NTC y enviar solo el valor numérico
+            Serial.println(leerTemperatura());
         } 
         else if (comando == "modo4") {
             // Modo 4: Activar el LED RGB y realizar animación
@@ -114,11 +109,36 @@ void loop() {
             apagarRGB(); // Apagar RGB
             Serial.println("Modo 9 activo: Sensor de llama desactivado");
         }
+        else if (comando.startsWith("stream:")) {
+            // stream:<hz> inicia el envío de tramas binarias a <hz> por segundo; stream:0 lo detiene
+            int hz = comando.substring(7).toInt();
+            if (hz <= 0) {
+                streamActivo = false;
+                Serial.println("Stream detenido");
+            } else {
+                if (hz > STREAM_MAX_HZ) {
+                    hz = STREAM_MAX_HZ;
+                }
+                periodoStream = 1000UL / hz;
+                secuenciaStream = 0;
+                ultimaTrama = millis();
+                streamActivo = true;
+                Serial.print("Stream activo: ");
+                Serial.print(hz);
+                Serial.println(" Hz");
+            }
+        }
         else {
             Serial.println("Comando no reconocido");
         }
     }
 
+    // Si el modo streaming está activo, enviar una trama cada periodoStream milisegundos
+    if (streamActivo && millis() - ultimaTrama >= periodoStream) {
+        ultimaTrama = millis();
+        enviarTrama();
+    }
+
     // Si el RGB está activo, ejecutar la animación
     if (rgbActivo) {
         animarRGB();
@@ -158,6 +178,55 @@ void loop() {
     }
 }
 
+float leerTemperatura() {
+    float ADCvalue = analogRead(NTCPin);
+    float voltage = (ADCvalue * 5.0) / 1023.0;
+    float resistance = (5.0 * SERIESRESISTOR / voltage) - SERIESRESISTOR;
+
+    // Cálculo de la temperatura con Steinhart-Hart
+    float steinhart;
+    steinhart = resistance / NOMINAL_RESISTANCE;
+    steinhart = log(steinhart);
+    steinhart /= BCOEFFICIENT;
+    steinhart += 1.0 / (NOMINAL_TEMPERATURE + 273.15);
+    steinhart = 1.0 / steinhart;
+    steinhart -= 273.15;
+    return steinhart;
+}
+
+// CRC-8 con polinomio 0x07 sobre los bytes de datos de la trama
+uint8_t crc8(const uint8_t *datos, uint8_t largo) {
+    uint8_t crc = 0;
+    for (uint8_t i = 0; i < largo; i++) {
+        crc ^= datos[i];
+        for (uint8_t bit = 0; bit < 8; bit++) {
+            crc = (crc & 0x80) ? (uint8_t)((crc << 1) ^ 0x07) : (uint8_t)(crc << 1);
+        }
+    }
+    return crc;
+}
+
+void enviarTrama() {
+    uint8_t trama[10];
+    int16_t temperatura = (int16_t)round(leerTemperatura() * 100);
+    uint16_t ruido = analogRead(sensorRuidoPinAO);
+    uint8_t llama = digitalRead(sensorLlamaPin) == HIGH ? 1 : 0;
+
+    trama[0] = 0xAA;
+    trama[1] = 0x55;
+    trama[2] = secuenciaStream & 0xFF;
+    trama[3] = secuenciaStream >> 8;
+    trama[4] = temperatura & 0xFF;
+    trama[5] = (temperatura >> 8) & 0xFF;
+    trama[6] = ruido & 0xFF;
+    trama[7] = ruido >> 8;
+    trama[8] = llama;
+    trama[9] = crc8(&trama[2], 7);
+
+    Serial.write(trama, sizeof(trama));
+    secuenciaStream++;
+}
+
 void setRGBColor(String color) {
     if (color == "RED") {
         analogWrite(redpin, 255);
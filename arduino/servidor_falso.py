@@ -0,0 +1,51 @@
+import argparse
+import gzip
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Servidor de prueba que imita POST /sensor-data/batch para probar envio_api.py sin la API real.
+# Puede simular una caída: responde 503 durante los primeros --caida segundos.
+# Uso:
+#   python servidor_falso.py --puerto 8001 --caida 30
+#   API_URL=http://localhost:8001 API_KEY=prueba python main.py
+
+
+class Manejador(BaseHTTPRequestHandler):
+    inicio = time.monotonic()
+    caida = 0.0
+    recibidas = 0
+
+    def do_POST(self):
+        if self.path != "/sensor-data/batch":
+            self.send_error(404)
+            return
+        cuerpo = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if time.monotonic() - Manejador.inicio < Manejador.caida:
+            self.send_error(503)
+            return
+
+        if self.headers.get("Content-Encoding") == "gzip":
+            cuerpo = gzip.decompress(cuerpo)
+        filas = [linea for linea in cuerpo.splitlines() if linea.strip()]
+        Manejador.recibidas += len(filas)
+        print(f"Lote de {len(filas)} lecturas ({Manejador.recibidas} en total)")
+
+        respuesta = json.dumps({"status": "Batch processed", "inserted": len(filas), "rejected": []}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(respuesta)))
+        self.end_headers()
+        self.wfile.write(respuesta)
+
+    def log_message(self, formato, *args):
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Imita el endpoint de lotes de la API")
+    parser.add_argument("--puerto", type=int, default=8001)
+    parser.add_argument("--caida", type=float, default=0.0, help="Segundos iniciales en que responde 503")
+    args = parser.parse_args()
+    Manejador.caida = args.caida
+    ThreadingHTTPServer(("127.0.0.1", args.puerto), Manejador).serve_forever()
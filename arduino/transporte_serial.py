@@ -0,0 +1,161 @@
+import asyncio
+import logging
+from protocolo import DecodificadorTramas
+
+# Transporte serial asíncrono para el Arduino.
+# Una sola tarea lee el puerto y otra envía los comandos de una cola de a uno; cada comando espera
+# su respuesta con un timeout propio, así ningún handler de Telegram bloquea el event loop.
+
+TIMEOUT_COMANDO = 2.0  # Segundos que se espera la respuesta de un comando
+ESPERA_INICIAL = 2.0  # El Arduino se reinicia al abrir el puerto; hay que esperar antes de enviar
+DRENAJE_TRAS_TIMEOUT = 1.0  # Segundos que se descartan respuestas tardías antes de enviar el siguiente comando
+MAX_EVENTOS = 100  # Líneas no solicitadas que se guardan (nivel de ruido, alarmas, ...)
+MAX_TRAMAS = 1000  # Lecturas del modo streaming pendientes de consumir
+
+# Prefijo de la respuesta que el sketch envía para cada comando
+RESPUESTAS_ESPERADAS = {
+    "modo1": "Modo 1",
+    "modo2": "Modo 2",
+    "modo4": "Modo 4",
+    "modo5": "Modo 5",
+    "modo6": "Modo 6",
+    "modo7": "Modo 7",
+    "modo8": "Modo 8",
+    "modo9": "Modo 9",
+}
+
+
+def es_numero(linea):
+    try:
+        float(linea)
+        return True
+    except ValueError:
+        return False
+
+# Decide qué línea responde a un comando; las que no coinciden (p. ej. "Nivel de ruido analógico: ...",
+# que el sketch imprime continuamente con el modo 6) se tratan como eventos y no se confunden con la respuesta
+def validador_para(comando):
+    if comando == "modo3":
+        return es_numero
+    if comando.startswith("stream:"):
+        return lambda linea: linea.startswith("Stream")
+    prefijo = RESPUESTAS_ESPERADAS.get(comando)
+    if prefijo:
+        return lambda linea: linea.startswith(prefijo)
+    return lambda linea: linea == "Comando no reconocido" or not _es_evento(linea)
+
+def _es_evento(linea):
+    return linea.startswith(("Nivel de ruido", "Buzzer activado", "¡Fuego detectado!"))
+
+
+class ArduinoSerial:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, timeout: float = TIMEOUT_COMANDO,
+                 drenaje: float = DRENAJE_TRAS_TIMEOUT):
+        self.reader = reader
+        self.writer = writer
+        self.timeout = timeout
+        self.drenaje = drenaje
+        self.eventos = asyncio.Queue(maxsize=MAX_EVENTOS)
+        self.tramas = asyncio.Queue(maxsize=MAX_TRAMAS)  # Lecturas decodificadas del modo streaming
+        self.decodificador = DecodificadorTramas()
+        self._comandos = asyncio.Queue()
+        self._pendiente = None  # (validador, future) del comando que espera respuesta
+        self._drenando = False  # True mientras se descartan las respuestas tardías de un comando vencido
+        self._tareas = []
+
+    # Abre el puerto con pyserial-asyncio (acepta rutas de pty para probar con un Arduino falso)
+    @classmethod
+    async def abrir(cls, puerto: str, baudios: int = 9600, timeout: float = TIMEOUT_COMANDO, espera_inicial: float = ESPERA_INICIAL):
+        import serial_asyncio
+
+        reader, writer = await serial_asyncio.open_serial_connection(url=puerto, baudrate=baudios)
+        await asyncio.sleep(espera_inicial)
+        transporte = cls(reader, writer, timeout)
+        transporte.iniciar()
+        return transporte
+
+    def iniciar(self):
+        self._tareas = [
+            asyncio.create_task(self._leer(), name="arduino-lector"),
+            asyncio.create_task(self._procesar_comandos(), name="arduino-comandos"),
+        ]
+
+    # Envía un comando y devuelve la línea de respuesta; lanza asyncio.TimeoutError si no llega a tiempo
+    async def enviar(self, comando: str, timeout: float = None, validador=None) -> str:
+        future = asyncio.get_running_loop().create_future()
+        await self._comandos.put((comando, validador or validador_para(comando), timeout or self.timeout, future))
+        return await future
+
+    async def _procesar_comandos(self):
+        while True:
+            comando, validador, timeout, future = await self._comandos.get()
+            if future.done():
+                continue
+            self._pendiente = (validador, future)
+            try:
+                self.writer.write((comando + "\n").encode("utf-8"))
+                await self.writer.drain()
+                # asyncio.wait no cancela el future ni se traga una cancelación de esta tarea (wait_for sí, en 3.11)
+                await asyncio.wait({future}, timeout=timeout)
+                if not future.done():
+                    future.set_exception(asyncio.TimeoutError(f"Sin respuesta del Arduino a '{comando}'"))
+                    # Las respuestas se reconocen por su contenido y no llevan número de secuencia: si la del comando
+                    # vencido llega tarde, el siguiente la tomaría como propia. Se descarta lo que llegue un rato
+                    self._pendiente = None
+                    self._drenando = True
+                    try:
+                        await asyncio.sleep(self.drenaje)
+                    finally:
+                        self._drenando = False
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self._pendiente = None
+
+    # Inicia el modo streaming del sketch; las lecturas llegan a la cola `tramas`
+    async def iniciar_stream(self, hz: int) -> str:
+        return await self.enviar(f"stream:{hz}")
+
+    async def detener_stream(self) -> str:
+        return await self.enviar("stream:0")
+
+    # Lee bytes (no líneas) porque en modo streaming las tramas binarias se mezclan con las respuestas de texto
+    async def _leer(self):
+        while True:
+            datos = await self.reader.read(4096)
+            if not datos:
+                logging.warning("Conexión serial cerrada")
+                break
+            lecturas, lineas = self.decodificador.alimentar(datos)
+            for lectura in lecturas:
+                _poner_descartando(self.tramas, lectura)
+            for linea in lineas:
+                self._procesar_linea(linea)
+
+    def _procesar_linea(self, linea):
+        if self._pendiente:
+            validador, future = self._pendiente
+            if not future.done() and validador(linea):
+                future.set_result(linea)
+                return
+
+        if self._drenando and not _es_evento(linea):
+            logging.info("Respuesta tardía descartada: %s", linea)
+            return
+
+        # Línea no solicitada: se guarda como evento
+        _poner_descartando(self.eventos, linea)
+
+    async def cerrar(self):
+        for tarea in self._tareas:
+            tarea.cancel()
+        await asyncio.gather(*self._tareas, return_exceptions=True)
+        self.writer.close()
+
+
+# Encola sin bloquear; si la cola está llena se descarta el elemento más antiguo
+def _poner_descartando(cola: asyncio.Queue, elemento):
+    if cola.full():
+        cola.get_nowait()
+    cola.put_nowait(elemento)
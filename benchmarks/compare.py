@@ -0,0 +1,48 @@
+import argparse
+import json
+import sys
+
+# Compara dos resultados de benchmarks.load_test y falla si algún escenario empeoró más del umbral.
+# Uso: python -m benchmarks.compare base.json nuevo.json --threshold 10
+
+
+def load(path):
+    with open(path) as f:
+        report = json.load(f)
+    return report, {result["scenario"]: result for result in report["results"]}
+
+
+def change(before: float, after: float) -> float:
+    return (after - before) / before * 100 if before else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara dos resultados de benchmark")
+    parser.add_argument("base")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Porcentaje de empeoramiento permitido en p95 y req/s")
+    args = parser.parse_args()
+
+    base_report, base = load(args.base)
+    candidate_report, candidate = load(args.candidate)
+    print(f"{base_report.get('commit')} -> {candidate_report.get('commit')}")
+
+    regressions = []
+    for name, before in base.items():
+        after = candidate.get(name)
+        if after is None:
+            continue
+        p95 = change(before["p95_ms"], after["p95_ms"])
+        rps = change(before["throughput_rps"], after["throughput_rps"])
+        print(f"{name:<20} p95 {before['p95_ms']:>8.2f} -> {after['p95_ms']:>8.2f} ms ({p95:+.1f}%)  "
+              f"req/s {before['throughput_rps']:>9.1f} -> {after['throughput_rps']:>9.1f} ({rps:+.1f}%)")
+        if p95 > args.threshold or rps < -args.threshold:
+            regressions.append(name)
+
+    if regressions:
+        print(f"Regresiones: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import argparse
+import time
+import numpy as np
+from downsample import DOWNSAMPLE_BATCH_SIZE, LttbDownsampler
+from models.sensor_data import SENSOR_METRICS
+
+# Mide el kernel LTTB de /sensor-data/range?points= sobre series sintéticas (1M lecturas por defecto),
+# alimentándolo por lotes como hace el cursor, y lo compara con un LTTB de una métrica en Python puro.
+# Uso (desde la raíz del repo): python -m benchmarks.downsampling --rows 1000000 --points 500 1000 2000
+
+
+# Lecturas cada segundo con ciclo diario, ruido con ráfagas y algunos huecos de luz (NaN)
+def make_series(rows: int, seed: int):
+    rng = np.random.default_rng(seed)
+    seconds = np.arange(rows, dtype=np.float64)
+    x = 1_704_067_200_000 + seconds * 1000
+    phase = (seconds % 86400) / 86400
+    temperature = 21 + 4 * np.sin(2 * np.pi * (phase - 0.375)) + rng.normal(0, 0.3, rows)
+    noise = np.maximum(0, rng.normal(420, 60, rows) + (rng.random(rows) < 0.01) * rng.uniform(300, 500, rows))
+    light = 900 * np.maximum(0, np.sin(np.pi * (phase - 0.25) * 2)) + rng.normal(0, 15, rows)
+    light[rng.random(rows) < 0.001] = np.nan
+    return x, np.column_stack((temperature, noise, light))
+
+
+def run_kernel(x, y, points: int, batch_size: int):
+    downsampler = LttbDownsampler(len(x), points, y.shape[1])
+    extra = [None] * batch_size
+    for start in range(0, len(x), batch_size):
+        end = min(start + batch_size, len(x))
+        downsampler.feed(x[start:end], y[start:end], extra[:end - start])
+    return downsampler.finish()
+
+
+# LTTB clásico de una sola serie, punto por punto (referencia de resultado y de tiempo)
+def reference_lttb(x, y, points: int):
+    total = len(x)
+    middle = total - 2
+    buckets = points - 2
+    selected = [0]
+    a = 0
+    for i in range(buckets):
+        start, end = 1 + i * middle // buckets, 1 + (i + 1) * middle // buckets
+        if i == buckets - 1:
+            next_start, next_end = total - 1, total
+        else:
+            next_start, next_end = end, 1 + (i + 2) * middle // buckets
+        avg_x = sum(x[next_start:next_end]) / (next_end - next_start)
+        avg_y = sum(y[next_start:next_end]) / (next_end - next_start)
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((x[a] - avg_x) * (y[j] - y[a]) - (x[a] - x[j]) * (avg_y - y[a]))
+            if area > best_area:
+                best, best_area = j, area
+        selected.append(best)
+        a = best
+    selected.append(total - 1)
+    return selected
+
+
+def best_of(fn, repeat: int):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del kernel LTTB")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--points", type=int, nargs="+", default=[500, 1000, 2000])
+    parser.add_argument("--batch-size", type=int, default=DOWNSAMPLE_BATCH_SIZE)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-reference", action="store_true", help="No ejecuta la referencia en Python puro")
+    args = parser.parse_args()
+
+    x, y = make_series(args.rows, args.seed)
+    print(f"lecturas: {args.rows}  métricas: {len(SENSOR_METRICS)}  lote: {args.batch_size}  (mejor de {args.repeat})")
+
+    for points in args.points:
+        elapsed, rows = best_of(lambda: run_kernel(x, y, points, args.batch_size), args.repeat)
+        line = (
+            f"points={points:5}  filas={len(rows):5}  kernel: {elapsed * 1000:8.1f} ms"
+            f"  ({args.rows / elapsed / 1e6:5.1f} M lecturas/s)"
+        )
+        if not args.no_reference:
+            # La referencia es de una sola métrica: se compara contra el kernel con solo temperatura
+            single = run_kernel(x, y[:, :1], points, args.batch_size)
+            x_list = x.tolist()
+            ref_elapsed, selected = best_of(lambda: reference_lttb(x_list, y[:, 0].tolist(), points), 1)
+            if [row[0] for row in single] != [x_list[i] for i in selected]:
+                raise SystemExit(f"El kernel no coincide con la referencia para points={points}")
+            line += f"  python puro (1 métrica): {ref_elapsed * 1000:8.1f} ms"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
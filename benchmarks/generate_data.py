@@ -0,0 +1,89 @@
+import os
+
+# Los benchmarks nunca deben escribir en la base real
+os.environ.setdefault("MONGO_DB_NAME", "TIC_bench")
+
+from datetime import datetime, timedelta
+import argparse
+import asyncio
+import math
+import random
+import time
+import bcrypt
+from database import db, sensor_collection, users_collection, ensure_indexes, MONGO_DB_NAME
+from rollups import backfill_rollups
+from sketches import backfill_sketches
+
+# Genera lecturas sintéticas en un mongod local para los benchmarks.
+# Uso (desde la raíz del repo):
+#   MONGO_DB_URL=mongodb://localhost:27017 python -m benchmarks.generate_data --count 1000000 --days 90
+
+BENCH_EMAIL = "bench@example.com"
+BENCH_PASSWORD = "bench-password"
+
+
+# Lectura con ciclo diario de temperatura y luz, ruido con ráfagas ocasionales
+def synthetic_reading(ts: datetime, rng: random.Random):
+    day_phase = (ts.hour * 3600 + ts.minute * 60 + ts.second) / 86400
+    daylight = max(0.0, math.sin(math.pi * (day_phase - 0.25) * 2))
+    noise = rng.gauss(420, 60)
+    if rng.random() < 0.01:
+        noise += rng.uniform(300, 500)
+    return {
+        "temperature": round(21 + 4 * math.sin(2 * math.pi * (day_phase - 0.375)) + rng.gauss(0, 0.3), 2),
+        "noise": round(max(0.0, noise), 1),
+        "light": round(900 * daylight + rng.gauss(0, 15), 1),
+        "timestamp": ts,
+    }
+
+
+async def generate(count: int, days: float, batch_size: int, seed: int, drop: bool, rollups: bool):
+    rng = random.Random(seed)
+    if drop:
+        await sensor_collection.drop()
+        await db["sensor_rollups"].drop()
+        await db["sensor_sketches"].drop()
+        await db["sensor_latest"].drop()
+    await ensure_indexes()
+
+    end = datetime.utcnow().replace(microsecond=0)
+    step = timedelta(days=days) / max(count, 1)
+    start = end - step * count
+
+    started = time.perf_counter()
+    batch = []
+    for i in range(count):
+        # Timestamps repartidos uniformemente con un poco de jitter
+        ts = start + step * i + timedelta(seconds=rng.uniform(0, min(step.total_seconds(), 1.0)))
+        batch.append(synthetic_reading(ts, rng))
+        if len(batch) >= batch_size:
+            await sensor_collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await sensor_collection.insert_many(batch, ordered=False)
+    elapsed = time.perf_counter() - started
+    print(f"{count} lecturas insertadas en '{MONGO_DB_NAME}' en {elapsed:.1f}s ({count / elapsed:.0f}/s)")
+
+    if rollups:
+        await backfill_rollups()
+        await backfill_sketches(batch_size)
+        print("Rollups y sketches reconstruidos")
+
+    # Usuario para el benchmark de /login
+    rounds = int(os.getenv("BCRYPT_ROUNDS", "12"))
+    hashed = bcrypt.hashpw(BENCH_PASSWORD.encode("utf-8"), bcrypt.gensalt(rounds=rounds)).decode("utf-8")
+    await users_collection.update_one(
+        {"email": BENCH_EMAIL}, {"$set": {"email": BENCH_EMAIL, "password": hashed}}, upsert=True
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Carga lecturas sintéticas para los benchmarks")
+    parser.add_argument("--count", type=int, default=10_000)
+    parser.add_argument("--days", type=float, default=30)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--append", action="store_true", help="No borra los datos existentes")
+    parser.add_argument("--no-rollups", action="store_true", help="No reconstruye los rollups ni los sketches")
+    args = parser.parse_args()
+    asyncio.run(generate(args.count, args.days, args.batch_size, args.seed, not args.append, not args.no_rollups))
@@ -0,0 +1,227 @@
+import os
+
+# Los benchmarks nunca deben escribir en la base real
+os.environ.setdefault("MONGO_DB_NAME", "TIC_bench")
+os.environ.setdefault("API_KEY", "bench-api-key")
+
+from datetime import datetime, timedelta
+import argparse
+import asyncio
+import json
+import random
+import resource
+import subprocess
+import sys
+import time
+import httpx
+from main import app, API_KEY
+from database import sensor_collection, MONGO_DB_NAME
+from benchmarks.generate_data import BENCH_EMAIL, BENCH_PASSWORD, synthetic_reading
+
+# Ejecuta la API en el mismo proceso (httpx + ASGI, sin red) contra un mongod local y mide cada endpoint.
+# Cada escenario corre en un proceso propio (lifespan y caches en frío), así el pico de memoria es de ese
+# escenario y no el acumulado de los anteriores; --same-process los corre todos juntos, sin medir memoria.
+# Uso (desde la raíz del repo, después de benchmarks.generate_data):
+#   MONGO_DB_URL=mongodb://localhost:27017 python -m benchmarks.load_test --requests 500 --concurrency 20 --output results.json
+
+SCENARIOS = ("ingest", "recent", "range", "average", "max", "login", "ingest_during_login")
+
+
+def percentile(sorted_values, p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+# Pico de memoria residente del proceso en MB (ru_maxrss viene en KB en Linux y en bytes en macOS)
+def peak_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def summarize(name: str, latencies, statuses, elapsed: float):
+    latencies = sorted(latencies)
+    result = {
+        "scenario": name,
+        "requests": len(latencies),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        "statuses": {str(code): statuses.count(code) for code in sorted(set(statuses))},
+    }
+    return result
+
+# Lanza `total` peticiones con `concurrency` tareas en paralelo y devuelve latencias y códigos
+async def drive(client, make_request, total: int, concurrency: int):
+    latencies = []
+    statuses = []
+    remaining = total
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            response = await make_request(client)
+            latencies.append(time.perf_counter() - started)
+            statuses.append(response.status_code)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, statuses, time.perf_counter() - started
+
+
+class Workload:
+    def __init__(self, first: datetime, last: datetime, window: timedelta, fixed_window: bool, seed: int):
+        self.first = first
+        self.last = last
+        self.window = window
+        self.fixed_window = fixed_window
+        self.rng = random.Random(seed)
+        self.headers = {"x-api-key": API_KEY}
+
+    # Ventana de fechas para los endpoints de rango: fija (para medir el cache) o aleatoria dentro de los datos
+    def window_params(self):
+        if self.fixed_window or self.last - self.first <= self.window:
+            end = self.last
+        else:
+            span = (self.last - self.first - self.window).total_seconds()
+            end = self.first + self.window + timedelta(seconds=self.rng.uniform(0, span))
+        return {"start_date": (end - self.window).isoformat(), "end_date": end.isoformat()}
+
+    async def ingest(self, client):
+        reading = synthetic_reading(datetime.utcnow(), self.rng)
+        reading["timestamp"] = reading["timestamp"].isoformat()
+        return await client.post("/sensor-data", json=reading, headers=self.headers)
+
+    async def recent(self, client):
+        return await client.get("/sensor-data/recent")
+
+    async def range(self, client):
+        return await client.get("/sensor-data/range", params=self.window_params(), headers=self.headers)
+
+    async def average(self, client):
+        return await client.get("/sensor-data/average", params=self.window_params(), headers=self.headers)
+
+    async def max(self, client):
+        return await client.get("/sensor-data/max", params=self.window_params(), headers=self.headers)
+
+    async def login(self, client):
+        return await client.post("/login", json={"email": BENCH_EMAIL, "password": BENCH_PASSWORD})
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+async def run_scenarios(args):
+    first = await sensor_collection.find_one(sort=[("timestamp", 1)])
+    last = await sensor_collection.find_one(sort=[("timestamp", -1)])
+    if not first:
+        print(f"No hay datos en '{MONGO_DB_NAME}'; ejecuta primero python -m benchmarks.generate_data")
+        sys.exit(1)
+    dataset_size = await sensor_collection.estimated_document_count()
+    workload = Workload(first["timestamp"], last["timestamp"], timedelta(hours=args.range_hours), args.fixed_window, args.seed)
+
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            # ru_maxrss nunca baja: el pico antes de empezar sirve de base para ver cuánto sumó el escenario
+            baseline_rss = peak_rss_mb()
+            for name in args.scenarios:
+                if name == "ingest_during_login":
+                    # Ingesta mientras hay una ráfaga de logins: la latencia de ingesta no debería subir
+                    login_task = asyncio.create_task(drive(client, workload.login, args.login_requests, args.concurrency))
+                    latencies, statuses, elapsed = await drive(client, workload.ingest, args.requests, args.concurrency)
+                    await login_task
+                else:
+                    latencies, statuses, elapsed = await drive(client, getattr(workload, name), args.requests, args.concurrency)
+                result = summarize(name, latencies, statuses, elapsed)
+                if not args.same_process:
+                    result["baseline_rss_mb"] = round(baseline_rss, 1)
+                    result["peak_rss_mb"] = round(peak_rss_mb(), 1)
+                results.append(result)
+    return dataset_size, results
+
+
+def print_result(result):
+    rss = f"rss {result['baseline_rss_mb']:>7.1f} -> {result['peak_rss_mb']:>7.1f} MB  " if "peak_rss_mb" in result else ""
+    print(
+        f"{result['scenario']:<20} {result['throughput_rps']:>9.1f} req/s  "
+        f"p50 {result['p50_ms']:>8.2f} ms  p95 {result['p95_ms']:>8.2f} ms  p99 {result['p99_ms']:>8.2f} ms  "
+        f"{rss}{result['statuses']}"
+    )
+
+# Corre un escenario en un proceso nuevo con los mismos parámetros; el hijo imprime su resultado en JSON
+def run_isolated(args, name: str):
+    command = [
+        sys.executable, "-m", "benchmarks.load_test", "--child", "--scenarios", name,
+        "--requests", str(args.requests), "--concurrency", str(args.concurrency),
+        "--login-requests", str(args.login_requests), "--range-hours", str(args.range_hours),
+        "--seed", str(args.seed),
+    ]
+    if args.fixed_window:
+        command.append("--fixed-window")
+    proc = subprocess.run(command, capture_output=True, text=True, check=False)
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stdout[-2000:] + proc.stderr[-4000:])
+        raise SystemExit(f"El escenario {name} falló")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+async def run(args):
+    if args.child:
+        dataset_size, results = await run_scenarios(args)
+        print(json.dumps({"dataset_size": dataset_size, "result": results[0]}))
+        return
+
+    if args.same_process:
+        dataset_size, results = await run_scenarios(args)
+        for result in results:
+            print_result(result)
+    else:
+        dataset_size, results = None, []
+        for name in args.scenarios:
+            child = run_isolated(args, name)
+            dataset_size = child["dataset_size"]
+            results.append(child["result"])
+            print_result(child["result"])
+
+    report = {
+        "commit": _git_commit(),
+        "created_at": datetime.utcnow().isoformat(),
+        "database": MONGO_DB_NAME,
+        "dataset_size": dataset_size,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "range_hours": args.range_hours,
+        "fixed_window": args.fixed_window,
+        "isolated": not args.same_process,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Resultados guardados en {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de los endpoints de la API")
+    parser.add_argument("--requests", type=int, default=200, help="Peticiones por escenario")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--login-requests", type=int, default=50, help="Logins lanzados en ingest_during_login")
+    parser.add_argument("--range-hours", type=float, default=24, help="Tamaño de la ventana de /range, /average y /max")
+    parser.add_argument("--fixed-window", action="store_true", help="Repite siempre la misma ventana (mide el cache)")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Archivo JSON con los resultados")
+    parser.add_argument("--same-process", action="store_true", help="Corre todos los escenarios en este proceso (sin medir memoria)")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta
+from typing import List
+import argparse
+import json
+import random
+import time
+from bson import ObjectId
+from pydantic import TypeAdapter
+from starlette.responses import JSONResponse
+from models.sensor_data import SensorData
+from streaming import encode_json_rows, ROW_FIELDS
+
+# Micro-benchmark de la serialización de /recent y /range: response_model=List[SensorData] de FastAPI
+# (validación + serialización por fila de pydantic + json) contra la ruta rápida (proyección + orjson).
+# Uso: python -m benchmarks.serialization --rows 10000 --repeat 20
+
+
+def make_docs(rows: int, with_id: bool):
+    rng = random.Random(42)
+    start = datetime(2024, 1, 1)
+    docs = []
+    for i in range(rows):
+        doc = {
+            "temperature": round(rng.uniform(15, 30), 2),
+            "noise": round(rng.uniform(200, 900), 1),
+            "light": round(rng.uniform(0, 1023), 1),
+            # Mongo guarda milisegundos, así que las fechas vuelven con microsegundos múltiplos de 1000
+            "timestamp": start + timedelta(milliseconds=i * 1500 + rng.randint(0, 999)),
+            "device_id": f"placa-{i % 4}",
+        }
+        if with_id:
+            doc["_id"] = ObjectId()
+        docs.append(doc)
+    return docs
+
+
+# Lo mismo que hace FastAPI con un response_model: validar cada fila, serializarla y pasarla a JSONResponse
+def fastapi_path(docs, adapter) -> bytes:
+    value = adapter.validate_python(docs)
+    return JSONResponse(adapter.dump_python(value, mode="json")).body
+
+
+def fast_path(docs) -> bytes:
+    return encode_json_rows(docs)
+
+
+def timeit(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara la serialización de filas de sensores")
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    adapter = TypeAdapter(List[SensorData])
+    # Antes se traían los documentos completos (con _id); ahora solo los campos de ROW_FIELDS
+    full_docs = make_docs(args.rows, with_id=True)
+    projected_docs = [{field: doc[field] for field in ROW_FIELDS} for doc in full_docs]
+
+    if json.loads(fastapi_path(full_docs, adapter)) != json.loads(fast_path(projected_docs)):
+        raise SystemExit("Las dos rutas no producen el mismo JSON")
+
+    before = timeit(lambda: fastapi_path(full_docs, adapter), args.repeat)
+    after = timeit(lambda: fast_path(projected_docs), args.repeat)
+    per_10k = 10_000 / args.rows
+    print(f"filas: {args.rows}  (mejor de {args.repeat})")
+    print(f"response_model + json : {before * 1000 * per_10k:8.2f} ms / 10k filas")
+    print(f"proyección + orjson   : {after * 1000 * per_10k:8.2f} ms / 10k filas")
+    print(f"aceleración           : {before / after:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
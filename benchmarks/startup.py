@@ -0,0 +1,125 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Mide el arranque en frío de la API: tiempo de importar main, de ejecutar el lifespan (cliente de Mongo,
+# índices, warm-up) y de la primera respuesta, más la memoria residente al terminar. Cada corrida es un
+# proceso nuevo con -X importtime, así que también se listan los módulos que más tardan en importarse.
+# Uso (desde la raíz del repo):
+#   MONGO_DB_URL=mongodb://localhost:27017 python -m benchmarks.startup --runs 5 --output startup.json
+#   python -m benchmarks.startup --skip-lifespan   # solo imports, sin Mongo
+
+# Código que corre en el proceso hijo; imprime una línea JSON con los tiempos
+CHILD = """
+import os, sys, time, json, resource, asyncio, contextlib
+started = time.perf_counter()
+os.environ.setdefault("MONGO_DB_NAME", "TIC_bench")
+os.environ.setdefault("API_KEY", "bench-api-key")
+import main
+imported = time.perf_counter()
+result = {"import_s": imported - started}
+
+async def run():
+    import httpx
+    skip = os.environ.get("STARTUP_SKIP_LIFESPAN")
+    async with contextlib.nullcontext() if skip else main.app.router.lifespan_context(main.app):
+        ready = time.perf_counter()
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            await client.get("/")
+        return ready, time.perf_counter()
+
+ready, first = asyncio.run(run())
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+result["lifespan_s"] = ready - imported
+result["first_response_s"] = first - ready
+result["total_s"] = first - started
+result["peak_rss_mb"] = rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+result["modules"] = len(sys.modules)
+print(json.dumps(result))
+"""
+
+
+# Convierte la salida de -X importtime en {módulo: acumulado} en segundos
+def parse_importtime(stderr: str):
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        modules[name] = int(cumulative) / 1e6
+    return modules
+
+# Costo de cada paquete de primer nivel: el acumulado del primer import que lo cargó (el mayor de sus módulos).
+# Se excluye main, cuyo acumulado es el total
+def slowest_packages(modules):
+    packages = {}
+    for name, cumulative in modules.items():
+        package = name.split(".")[0]
+        if package != "main":
+            packages[package] = max(packages.get(package, 0.0), cumulative)
+    return sorted(packages.items(), key=lambda item: item[1], reverse=True)
+
+
+def run_once(skip_lifespan: bool):
+    env = dict(os.environ)
+    if skip_lifespan:
+        env["STARTUP_SKIP_LIFESPAN"] = "1"
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHILD],
+        capture_output=True, text=True, env=env, check=False,
+    )
+    wall = time.perf_counter() - started
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stderr[-4000:])
+        raise SystemExit("El proceso de arranque falló")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["process_wall_s"] = wall
+    return result, parse_importtime(proc.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mide el tiempo de arranque e importación de la API")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="Paquetes más lentos a mostrar")
+    parser.add_argument("--skip-lifespan", action="store_true", help="No ejecuta el lifespan (no necesita Mongo)")
+    parser.add_argument("--output", help="Archivo JSON con los resultados")
+    args = parser.parse_args()
+
+    runs = []
+    imports = None
+    for _ in range(args.runs):
+        result, modules = run_once(args.skip_lifespan)
+        runs.append(result)
+        # La primera corrida puede pagar la compilación de .pyc; se guardan los imports de la última
+        imports = modules
+
+    keys = ("process_wall_s", "import_s", "lifespan_s", "first_response_s", "total_s", "peak_rss_mb")
+    report = {key: round(statistics.median(run[key] for run in runs), 4) for key in keys}
+    report["runs"] = args.runs
+    report["modules"] = runs[-1]["modules"]
+    report["slowest_imports"] = [
+        {"package": name, "cumulative_ms": round(cumulative * 1000, 1)}
+        for name, cumulative in slowest_packages(imports)[:args.top]
+    ]
+
+    print(f"corridas: {args.runs} (mediana)")
+    for key in keys:
+        unit = "MB" if key == "peak_rss_mb" else "s"
+        print(f"{key:18}: {report[key]:10.4f} {unit}")
+    print("imports más lentos (acumulado):")
+    for entry in report["slowest_imports"]:
+        print(f"  {entry['package']:30} {entry['cumulative_ms']:9.1f} ms")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
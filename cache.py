@@ -0,0 +1,122 @@
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import datetime
+import os
+import time
+from timeutils import to_utc_naive
+
+# Tamaño máximo (entradas) y tiempo de vida (segundos) del cache de rangos
+RANGE_CACHE_SIZE = int(os.getenv("RANGE_CACHE_SIZE", "256"))
+RANGE_CACHE_TTL = float(os.getenv("RANGE_CACHE_TTL", "300"))
+
+
+# Cálculo de un valor en curso (consulta a Mongo): junta las lecturas invalidadas mientras tanto,
+# para que set descarte el resultado solo si alguna cae dentro de su ventana
+class PendingRange:
+    def __init__(self):
+        self.stamps = []
+
+    def touches(self, start_date: datetime, end_date: datetime) -> bool:
+        start_date = to_utc_naive(start_date)
+        end_date = to_utc_naive(end_date)
+        return any(start_date <= ts <= end_date for ts in self.stamps)
+
+
+# Cache LRU en memoria de resultados por (endpoint, start_date, end_date), con fechas normalizadas a UTC.
+# Una entrada solo se invalida cuando llega una lectura dentro de su ventana (o vence el TTL),
+# así que las ventanas históricas cerradas quedan en cache hasta que las desaloje el LRU.
+class RangeCache:
+    def __init__(self, max_size: int = RANGE_CACHE_SIZE, ttl: float = RANGE_CACHE_TTL, on_evict=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        # Se llama con el valor de cada entrada que sale del cache (p. ej. para borrar un archivo)
+        self.on_evict = on_evict
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._pending = set()
+
+    def _key(self, endpoint: str, start_date: datetime, end_date: datetime):
+        return (endpoint, to_utc_naive(start_date), to_utc_naive(end_date))
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None and self.on_evict:
+            self.on_evict(entry[1])
+
+    # Devuelve (True, valor) si hay una entrada vigente, (False, None) si no
+    def get(self, endpoint: str, start_date: datetime, end_date: datetime):
+        key = self._key(endpoint, start_date, end_date)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[1]
+        if entry is not None:
+            self._discard(key)
+        self.misses += 1
+        return False, None
+
+    # Registra un cálculo antes de consultar Mongo; su resultado se pasa a set junto con `pending`
+    # y done lo saca del registro (también si la consulta falla)
+    def begin(self) -> PendingRange:
+        pending = PendingRange()
+        self._pending.add(pending)
+        return pending
+
+    def done(self, pending: PendingRange):
+        self._pending.discard(pending)
+
+    # Devuelve False si no se guardó porque durante el cálculo llegaron lecturas dentro de la ventana
+    def set(self, endpoint: str, start_date: datetime, end_date: datetime, value, pending: PendingRange = None):
+        if pending is not None and pending.touches(start_date, end_date):
+            return False
+        key = self._key(endpoint, start_date, end_date)
+        previous = self._entries.get(key)
+        if previous is not None and previous[1] != value:
+            self._discard(key)
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._discard(next(iter(self._entries)))
+        return True
+
+    # Elimina las entradas cuya ventana contiene alguno de los timestamps recién insertados
+    def invalidate(self, timestamps):
+        stamps = sorted(to_utc_naive(ts) for ts in timestamps if ts is not None)
+        if not stamps:
+            return
+        # Aunque no haya entradas puede haber un cálculo en curso cuya ventana incluya estas lecturas
+        for pending in self._pending:
+            pending.stamps.extend(stamps)
+        if not self._entries:
+            return
+        stale = []
+        for key in self._entries:
+            _, start_date, end_date = key
+            i = bisect_left(stamps, start_date)
+            if i < len(stamps) and stamps[i] <= end_date:
+                stale.append(key)
+        for key in stale:
+            self._discard(key)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        for key in list(self._entries):
+            self._discard(key)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+
+range_cache = RangeCache()
@@ -1,11 +1,119 @@
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING
+from pymongo.errors import CollectionInvalid
+from metrics import MongoCommandMetrics
 import os
 
 # Lee la URL de conexión desde una variable de entorno
 MONGO_DB_URL = os.getenv("MONGO_DB_URL")
+MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "TIC")
 
-# Crear cliente y base de datos
-client = AsyncIOMotorClient(MONGO_DB_URL)
-db = client["TIC"]  # Selecciona la base de datos "TIC"
-sensor_collection = db["sensor"]  # Selecciona la colección "sensor"
-users_collection = db["users"] # Colección de usuarios 
\ No newline at end of file
+# Modo opcional: guardar las lecturas en una colección time-series de MongoDB (requiere MongoDB 5.0+)
+USE_TIMESERIES = os.getenv("SENSOR_TIMESERIES", "false").lower() in ("1", "true", "yes")
+TIMESERIES_COLLECTION = os.getenv("SENSOR_TIMESERIES_COLLECTION", "sensor_ts")
+TIMESERIES_GRANULARITY = os.getenv("SENSOR_TIMESERIES_GRANULARITY", "seconds")
+
+# Pool de conexiones y tiempos de espera (milisegundos) del cliente
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "30000"))
+
+client = None
+_database = None
+
+
+# Crea el cliente (la API lo hace en el lifespan; los scripts, en el primer uso de una colección)
+def connect():
+    global client, _database
+    if client is None:
+        client = AsyncIOMotorClient(
+            MONGO_DB_URL,
+            maxPoolSize=MONGO_MAX_POOL_SIZE,
+            minPoolSize=MONGO_MIN_POOL_SIZE,
+            serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+            connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+            socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+            event_listeners=[MongoCommandMetrics()],
+        )
+        _database = client[MONGO_DB_NAME]
+    return client
+
+def close():
+    global client, _database
+    if client is not None:
+        client.close()
+        client = None
+        _database = None
+
+# True si Mongo responde a un ping (readiness check)
+async def ping() -> bool:
+    try:
+        await connect().admin.command("ping")
+        return True
+    except Exception:
+        return False
+
+
+# La base de datos y las colecciones se importan desde otros módulos antes de que exista el cliente,
+# así que cada una resuelve el objeto de Motor recién cuando se usa
+class _LazyDatabase:
+    def _resolve(self):
+        connect()
+        return _database
+
+    def __getitem__(self, name):
+        return self._resolve()[name]
+
+    def __getattr__(self, attr):
+        return getattr(self._resolve(), attr)
+
+
+class _LazyCollection:
+    def __init__(self, name: str):
+        self.name = name
+
+    def __getattr__(self, attr):
+        return getattr(db[self.name], attr)
+
+
+db = _LazyDatabase()  # Base de datos ("TIC" por defecto)
+sensor_collection = _LazyCollection(TIMESERIES_COLLECTION if USE_TIMESERIES else "sensor")  # Colección de lecturas ("sensor" por defecto)
+users_collection = _LazyCollection("users") # Colección de usuarios
+rollups_collection = _LazyCollection("sensor_rollups") # Rollups por minuto/hora/día de la colección "sensor"
+latest_collection = _LazyCollection("sensor_latest") # Última lectura de cada placa (_id = device_id)
+sketches_collection = _LazyCollection("sensor_sketches") # Sketches de percentiles por hora
+
+
+# Crea la colección time-series si todavía no existe
+async def ensure_timeseries_collection():
+    existing = await db.list_collection_names(filter={"name": TIMESERIES_COLLECTION})
+    if existing:
+        return
+    try:
+        await db.create_collection(
+            TIMESERIES_COLLECTION,
+            # device_id como metaField agrupa los buckets por placa
+            timeseries={"timeField": "timestamp", "metaField": "device_id", "granularity": TIMESERIES_GRANULARITY},
+        )
+    except CollectionInvalid:
+        # Otro worker la creó al mismo tiempo
+        pass
+
+# Índices que necesitan las consultas de la API; create_index es idempotente
+async def ensure_indexes():
+    # Primero el índice único de usuarios: si fallara un índice de lecturas, /users no debe quedar sin él
+    # (búsquedas por email en /login y /users, sin cuentas duplicadas)
+    await users_collection.create_index([("email", ASCENDING)], unique=True)
+
+    if USE_TIMESERIES:
+        await ensure_timeseries_collection()
+        # En time-series los índices secundarios van sobre timeField y metaField; _id no forma parte de ellos
+        await sensor_collection.create_index([("timestamp", ASCENDING)])
+        await sensor_collection.create_index([("device_id", ASCENDING), ("timestamp", ASCENDING)])
+        return
+    # Rangos por fecha, /recent (orden descendente) y paginación por (timestamp, _id)
+    await sensor_collection.create_index([("timestamp", ASCENDING), ("_id", ASCENDING)])
+    # Las mismas consultas filtradas por placa
+    await sensor_collection.create_index([("device_id", ASCENDING), ("timestamp", ASCENDING), ("_id", ASCENDING)])
@@ -0,0 +1,40 @@
+from pymongo import UpdateOne
+from database import latest_collection
+from streaming import row_to_dict
+from timeutils import to_utc_naive
+
+
+# Se queda con la lectura más reciente de cada placa dentro del lote
+def _newest_by_device(docs):
+    newest = {}
+    for doc in docs:
+        device_id = doc.get("device_id")
+        ts = doc.get("timestamp")
+        if device_id is None or ts is None:
+            continue
+        current = newest.get(device_id)
+        if current is None or to_utc_naive(ts) >= to_utc_naive(current["timestamp"]):
+            newest[device_id] = doc
+    return newest
+
+# Actualiza la última lectura de cada placa con un upsert por placa.
+# El reemplazo es condicional en el servidor: una lectura atrasada (p. ej. reenviada desde la cola del bot)
+# no pisa a otra más nueva que ya esté guardada
+async def update_latest(docs):
+    operations = []
+    for device_id, doc in _newest_by_device(docs).items():
+        latest = {"_id": device_id, **row_to_dict(doc)}
+        is_newer = {"$gte": [doc["timestamp"], {"$ifNull": ["$timestamp", None]}]}
+        operations.append(UpdateOne(
+            {"_id": device_id},
+            [{"$replaceWith": {"$cond": [is_newer, {"$literal": latest}, "$$ROOT"]}}],
+            upsert=True,
+        ))
+
+    if operations:
+        await latest_collection.bulk_write(operations, ordered=False)
+
+# Última lectura de todas las placas, ordenadas por device_id (una sola consulta para la vista de flota)
+async def fleet_overview():
+    docs = await latest_collection.find({}, {"_id": 0}).sort("_id", 1).to_list(length=None)
+    return [row_to_dict(doc) for doc in docs]
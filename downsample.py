@@ -0,0 +1,173 @@
+from bson import decode_all
+from bson.codec_options import CodecOptions, DatetimeConversion
+from datetime import datetime, timedelta
+import asyncio
+import os
+import numpy as np
+from models.sensor_data import SENSOR_METRICS
+
+# Documentos por lote del cursor al reducir un rango
+DOWNSAMPLE_BATCH_SIZE = int(os.getenv("DOWNSAMPLE_BATCH_SIZE", "10000"))
+
+DOWNSAMPLE_PROJECTION = {"_id": 0, "timestamp": 1, "device_id": 1, **{metric: 1 for metric in SENSOR_METRICS}}
+_RAW_CODEC = CodecOptions(datetime_conversion=DatetimeConversion.DATETIME_MS)
+_EPOCH = datetime(1970, 1, 1)
+
+
+# Largest-Triangle-Three-Buckets sobre un flujo de lecturas ordenadas por fecha, para las tres métricas a la vez.
+# Con el total conocido de antemano los buckets quedan fijos, así que cada bucket se resuelve apenas llega
+# el siguiente y el buffer nunca guarda más que dos buckets más el lote en curso (memoria ~ total / points).
+# Dentro de cada bucket el área de los triángulos se calcula vectorizada sobre (lecturas x métricas);
+# cada métrica elige su propio punto y la salida es la unión de las lecturas elegidas (hasta 3 por bucket).
+class LttbDownsampler:
+    def __init__(self, total: int, points: int, metrics: int = len(SENSOR_METRICS)):
+        self.total = total
+        self.points = points
+        self.metrics = metrics
+        self.seen = 0
+        self._base = 0
+        # Buffer por métrica (métricas x lecturas, contiguo por métrica); los NaN se guardan aparte como máscara
+        self._x = np.empty(0)
+        self._y = np.empty((metrics, 0))
+        self._filled = np.empty((metrics, 0))
+        self._valid = np.empty((metrics, 0), dtype=bool)
+        self._extra = []
+        self._bucket = 0
+        self._prev_x = None
+        self._prev_y = None
+        self._selected = {}
+
+    # Límites [inicio, fin) en índices globales del bucket i; el bucket points-2 es el último punto
+    def _bounds(self, i: int):
+        if i >= self.points - 2:
+            return self.total - 1, self.total
+        middle = self.total - 2
+        buckets = self.points - 2
+        return 1 + i * middle // buckets, 1 + (i + 1) * middle // buckets
+
+    def _select(self, local: int):
+        index = self._base + local
+        if index not in self._selected:
+            self._selected[index] = (self._x[local], self._y[:, local].copy(), self._extra[local])
+
+    # Recibe un lote: x (ms desde epoch), y (lecturas x métricas, NaN si falta) y datos extra por fila
+    def feed(self, x, y, extra):
+        if self.total <= self.points:
+            for i in range(len(x)):
+                self._selected[self.seen + i] = (x[i], y[i], extra[i])
+            self.seen += len(x)
+            return
+        y = np.ascontiguousarray(y.T)
+        valid = ~np.isnan(y)
+        self._x = np.concatenate((self._x, x))
+        self._y = np.concatenate((self._y, y), axis=1)
+        self._filled = np.concatenate((self._filled, np.where(valid, y, 0.0)), axis=1)
+        self._valid = np.concatenate((self._valid, valid), axis=1)
+        self._extra.extend(extra)
+        if self.seen == 0 and len(x):
+            self._select(0)
+            self._prev_x = np.full(self.metrics, self._x[0])
+            self._prev_y = self._y[:, 0].copy()
+        self.seen += len(x)
+        self._drain(final=False)
+
+    # Media por métrica de las lecturas presentes en [start, end); `fallback` donde no hay ninguna
+    def _means(self, start: int, end: int, fallback):
+        counts = self._valid[:, start:end].sum(axis=1)
+        sums = self._filled[:, start:end].sum(axis=1)
+        return np.where(counts > 0, sums / np.maximum(counts, 1), fallback)
+
+    def _process(self, start: int, end: int, next_start: int, next_end: int):
+        xs = self._x[start:end]
+        ys = self._y[:, start:end]
+        if next_end > next_start:
+            avg_x = self._x[next_start:next_end].mean()
+            avg_y = self._means(next_start, next_end, self._prev_y)
+        else:
+            avg_x = xs[-1]
+            avg_y = self._prev_y
+        prev_x = self._prev_x
+        prev_y = self._prev_y
+        if np.isnan(prev_y).any() or np.isnan(avg_y).any():
+            # La métrica todavía no tiene punto anterior (faltaba en la primera lectura): se usa la media del bucket
+            prev_y = np.where(np.isnan(prev_y), self._means(start, end, 0.0), prev_y)
+            avg_y = np.where(np.isnan(avg_y), prev_y, avg_y)
+
+        # Doble del área del triángulo (anterior elegido, candidato, media del bucket siguiente) por métrica
+        area = np.abs(
+            ((prev_x - avg_x) * -prev_y - prev_x * (avg_y - prev_y))[:, None]
+            + (prev_x - avg_x)[:, None] * ys
+            + (avg_y - prev_y)[:, None] * xs
+        )
+        valid = self._valid[:, start:end]
+        chosen = np.where(valid, area, -1.0).argmax(axis=1)
+        for metric in np.flatnonzero(valid.any(axis=1)):
+            local = chosen[metric]
+            self._select(start + local)
+            self._prev_x[metric] = xs[local]
+            self._prev_y[metric] = ys[metric, local]
+
+    def _drain(self, final: bool):
+        available = self._base + len(self._x)
+        while self._bucket <= self.points - 3:
+            start, end = self._bounds(self._bucket)
+            next_start, next_end = self._bounds(self._bucket + 1)
+            if not final and available < next_end:
+                break
+            if min(end, available) > start:
+                self._process(
+                    start - self._base, min(end, available) - self._base,
+                    next_start - self._base, min(next_end, available) - self._base,
+                )
+            self._bucket += 1
+        # Lo anterior al bucket actual ya no hace falta (la última lectura se conserva para finish)
+        drop = min(self._bounds(self._bucket)[0], available - 1) - self._base
+        if drop > 0:
+            self._x = self._x[drop:]
+            self._y = self._y[:, drop:]
+            self._filled = self._filled[:, drop:]
+            self._valid = self._valid[:, drop:]
+            del self._extra[:drop]
+            self._base += drop
+
+    # Resuelve los buckets pendientes y devuelve [(x, fila de métricas, extra)] en orden
+    def finish(self):
+        if self.total > self.points and self.seen:
+            self._drain(final=True)
+            self._select(self.seen - 1 - self._base)
+        return [self._selected[index] for index in sorted(self._selected)]
+
+
+def _batch_to_arrays(raw: bytes):
+    docs = decode_all(raw, _RAW_CODEC)
+    x = np.fromiter((int(doc["timestamp"]) for doc in docs), dtype=np.float64, count=len(docs))
+    y = np.array([[doc.get(metric) for metric in SENSOR_METRICS] for doc in docs], dtype=np.float64).reshape(len(docs), len(SENSOR_METRICS))
+    return x, y, [doc.get("device_id") for doc in docs]
+
+def _feed(downsampler: LttbDownsampler, raw: bytes):
+    downsampler.feed(*_batch_to_arrays(raw))
+
+def _rows(downsampler: LttbDownsampler):
+    rows = []
+    for x, values, device_id in downsampler.finish():
+        row = {metric: None if np.isnan(value) else float(value) for metric, value in zip(SENSOR_METRICS, values)}
+        row["timestamp"] = _EPOCH + timedelta(milliseconds=int(x))
+        row["device_id"] = device_id
+        rows.append(row)
+    return rows
+
+# Reduce el rango a unos `points` puntos por métrica leyendo el cursor en lotes de BSON crudo.
+# Decodificar y procesar cada lote corre en un hilo (numpy libera el GIL en buena parte) para no frenar el loop;
+# los lotes se procesan de a uno, así que el downsampler nunca se usa desde dos hilos a la vez.
+# Devuelve (lecturas en el formato de las filas de /range, cantidad de lecturas del rango)
+async def downsample_range(collection, query, points: int):
+    total = await collection.count_documents(query)
+    if total == 0:
+        return [], 0
+    downsampler = LttbDownsampler(total, points)
+    cursor = collection.find_raw_batches(
+        query, DOWNSAMPLE_PROJECTION, sort=[("timestamp", 1)], limit=total
+    ).batch_size(DOWNSAMPLE_BATCH_SIZE)
+    async for raw in cursor:
+        await asyncio.to_thread(_feed, downsampler, raw)
+    return await asyncio.to_thread(_rows, downsampler), total
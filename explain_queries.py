@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta
+from database import sensor_collection, users_collection, ensure_indexes
+import asyncio
+import sys
+
+# Muestra el plan de ejecución de las consultas principales de la API y falla si alguna hace COLLSCAN.
+# Pensado para correr contra un mongod local desechable:
+#   MONGO_DB_URL=mongodb://localhost:27017 [SENSOR_TIMESERIES=true] python explain_queries.py
+
+
+# Recorre el documento de explain y junta los nombres de todas las etapas
+def _stages(plan, found=None):
+    found = [] if found is None else found
+    if isinstance(plan, dict):
+        for key, value in plan.items():
+            if key == "stage" and isinstance(value, str):
+                found.append(value)
+            else:
+                _stages(value, found)
+    elif isinstance(plan, list):
+        for item in plan:
+            _stages(item, found)
+    return found
+
+
+async def main():
+    await ensure_indexes()
+
+    end_date = datetime.utcnow()
+    start_date = end_date - timedelta(days=7)
+    queries = {
+        "range": sensor_collection.find({"timestamp": {"$gte": start_date, "$lte": end_date}}),
+        "recent": sensor_collection.find().sort("timestamp", -1).limit(10),
+        "login": users_collection.find({"email": "someone@example.com"}).limit(1),
+    }
+
+    collscan = False
+    for name, cursor in queries.items():
+        explain = await cursor.explain()
+        stages = _stages(explain.get("queryPlanner", explain))
+        print(f"{name}: {' <- '.join(stages)}")
+        if "COLLSCAN" in stages:
+            collscan = True
+
+    if collscan:
+        print("Hay consultas que recorren la colección completa")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,112 @@
+from bson import decode_all
+from bson.codec_options import CodecOptions, DatetimeConversion
+from functools import lru_cache
+import asyncio
+import io
+import os
+from models.sensor_data import SENSOR_METRICS
+
+# Documentos por lote del cursor; también es el tamaño de cada row group / record batch
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "50000"))
+
+EXPORT_PROJECTION = {"_id": 0, "timestamp": 1, "device_id": 1, **{metric: 1 for metric in SENSOR_METRICS}}
+
+EXPORT_FORMATS = {
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+}
+
+# Las fechas se decodifican como milisegundos (DatetimeMS) para no crear un datetime por fila
+_RAW_CODEC = CodecOptions(datetime_conversion=DatetimeConversion.DATETIME_MS)
+
+
+# pyarrow se importa recién en la primera exportación: tarda en cargar y la mayoría de los workers nunca exporta
+@lru_cache(maxsize=None)
+def export_schema():
+    import pyarrow as pa
+    return pa.schema(
+        [(metric, pa.float64()) for metric in SENSOR_METRICS]
+        + [("timestamp", pa.timestamp("ms")), ("device_id", pa.string())]
+    )
+
+
+# Destino en memoria para los writers de Arrow: se vacía después de cada lote
+class _ChunkSink(io.RawIOBase):
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+# Convierte un lote de BSON crudo (tal como llega de find_raw_batches) en un RecordBatch.
+# decode_all sigue armando un dict por documento y las columnas se juntan fila a fila:
+# lo que se ahorra es el modelo Pydantic y el datetime por fila, no la decodificación por fila
+def raw_batch_to_record_batch(raw: bytes):
+    import pyarrow as pa
+    docs = decode_all(raw, _RAW_CODEC)
+    arrays = [pa.array([doc.get(metric) for doc in docs], type=pa.float64()) for metric in SENSOR_METRICS]
+    timestamps = [doc.get("timestamp") for doc in docs]
+    arrays.append(pa.array([int(ts) if ts is not None else None for ts in timestamps], type=pa.int64()).cast(pa.timestamp("ms")))
+    arrays.append(pa.array([doc.get("device_id") for doc in docs], type=pa.string()))
+    return pa.RecordBatch.from_arrays(arrays, schema=export_schema())
+
+
+class _Exporter:
+    def __init__(self, fmt: str):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self.sink = _ChunkSink()
+        if fmt == "parquet":
+            self.writer = pq.ParquetWriter(self.sink, export_schema(), compression="zstd")
+        else:
+            self.writer = pa.ipc.new_stream(self.sink, export_schema())
+
+    def write(self, raw: bytes) -> bytes:
+        self.writer.write_batch(raw_batch_to_record_batch(raw))
+        return self.sink.drain()
+
+    def close(self) -> bytes:
+        self.writer.close()
+        return self.sink.drain()
+
+
+# Abre el cursor del rango y trae el primer lote no vacío, así el endpoint puede responder 404
+# antes de empezar el stream. Devuelve (cursor, None) si el rango no tiene lecturas
+async def open_export(collection, query):
+    cursor = collection.find_raw_batches(
+        query, EXPORT_PROJECTION, sort=[("timestamp", 1), ("_id", 1)]
+    ).batch_size(EXPORT_BATCH_SIZE)
+    async for raw in cursor:
+        if raw:
+            return cursor, raw
+    return cursor, None
+
+
+# Recorre el rango en lotes de BSON crudo y va emitiendo el archivo Parquet / Arrow IPC,
+# empezando por el lote que ya trajo open_export.
+# La decodificación y escritura corren en un hilo para no bloquear el event loop;
+# la memoria queda acotada por EXPORT_BATCH_SIZE y no por el tamaño del rango.
+async def stream_export(cursor, first: bytes, fmt: str):
+    exporter = _Exporter(fmt)
+    yield await asyncio.to_thread(exporter.write, first)
+    async for raw in cursor:
+        chunk = await asyncio.to_thread(exporter.write, raw)
+        if chunk:
+            yield chunk
+    yield await asyncio.to_thread(exporter.close)
@@ -0,0 +1,175 @@
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+from pymongo.write_concern import WriteConcern
+import asyncio
+import logging
+import math
+import os
+
+logger = logging.getLogger(__name__)
+
+# Modo opcional: POST /sensor-data encola la lectura y responde 202; un flusher la inserta después en lote
+WRITE_BEHIND = os.getenv("WRITE_BEHIND", "false").lower() in ("1", "true", "yes")
+# Lecturas en espera como máximo (con la cola llena se responde 429)
+WRITE_BEHIND_QUEUE_SIZE = int(os.getenv("WRITE_BEHIND_QUEUE_SIZE", "10000"))
+# Se inserta cuando se juntan WRITE_BEHIND_FLUSH_SIZE lecturas o pasan WRITE_BEHIND_FLUSH_INTERVAL segundos desde la primera
+WRITE_BEHIND_FLUSH_SIZE = int(os.getenv("WRITE_BEHIND_FLUSH_SIZE", "500"))
+WRITE_BEHIND_FLUSH_INTERVAL = float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL", "0.5"))
+# Write concern de los insert_many: w=0 es lo más rápido, w=majority con j=true lo más durable
+WRITE_BEHIND_W = os.getenv("WRITE_BEHIND_W", "1")
+WRITE_BEHIND_J = os.getenv("WRITE_BEHIND_J", "false").lower() in ("1", "true", "yes")
+# Reintentos de un lote si Mongo no responde y tiempo máximo para vaciar la cola al apagar la API
+WRITE_BEHIND_RETRIES = int(os.getenv("WRITE_BEHIND_RETRIES", "3"))
+WRITE_BEHIND_DRAIN_TIMEOUT = float(os.getenv("WRITE_BEHIND_DRAIN_TIMEOUT", "30"))
+# Código de error de Mongo para clave duplicada
+DUPLICATE_KEY = 11000
+
+
+class IngestQueueFull(Exception):
+    pass
+
+
+def _write_concern(w: str, j: bool) -> WriteConcern:
+    return WriteConcern(w=int(w) if w.isdigit() else w, j=j or None)
+
+
+# Cola acotada de lecturas validadas que un flusher en segundo plano agrupa en insert_many.
+# Lo encolado vive en memoria del proceso: si el proceso muere sin apagado ordenado se pierde,
+# por eso es opcional y la durabilidad se regula con el write concern.
+class IngestQueue:
+    def __init__(self, max_size: int = WRITE_BEHIND_QUEUE_SIZE, flush_size: int = WRITE_BEHIND_FLUSH_SIZE,
+                 flush_interval: float = WRITE_BEHIND_FLUSH_INTERVAL, write_concern: WriteConcern = None,
+                 retries: int = WRITE_BEHIND_RETRIES):
+        self.max_size = max_size
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.write_concern = write_concern or _write_concern(WRITE_BEHIND_W, WRITE_BEHIND_J)
+        self.retries = retries
+        # Segundos sugeridos en Retry-After cuando la cola está llena
+        self.retry_after = max(1, math.ceil(flush_interval))
+        self.flushed = 0
+        self.dropped = 0
+        self._queue = None
+        self._task = None
+        self._collection = None
+        self._on_insert = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    # Arranca el flusher; `on_insert` recibe las lecturas ya guardadas (cache, rollups, SSE...)
+    def start(self, collection, on_insert):
+        self._collection = collection.with_options(write_concern=self.write_concern)
+        self._on_insert = on_insert
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._task = asyncio.create_task(self._run())
+
+    def put(self, doc):
+        try:
+            self._queue.put_nowait(doc)
+        except asyncio.QueueFull:
+            raise IngestQueueFull()
+
+    # Espera hasta flush_size lecturas o hasta que venza el intervalo contado desde la primera
+    async def _next_batch(self):
+        batch = [await self._queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.flush_interval
+        while len(batch) < self.flush_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    # _id de las lecturas del lote que ya quedaron guardadas en un intento anterior cortado a mitad.
+    # Las colecciones time-series no tienen índice único en _id (no hay error 11000 que lo avise),
+    # así que se consultan antes de reintentar; el rango de timestamp del lote acota los buckets revisados
+    async def _stored_ids(self, batch):
+        timestamps = [doc["timestamp"] for doc in batch]
+        cursor = self._collection.find(
+            {"_id": {"$in": [doc["_id"] for doc in batch]}, "timestamp": {"$gte": min(timestamps), "$lte": max(timestamps)}},
+            {"_id": 1},
+        )
+        return {doc["_id"] async for doc in cursor}
+
+    async def _insert(self, batch):
+        # Los _id se asignan acá y no en insert_many, así un reintento reconoce las filas ya guardadas
+        for doc in batch:
+            doc.setdefault("_id", ObjectId())
+        stored = []
+        pending = batch
+        for attempt in range(self.retries + 1):
+            try:
+                if attempt:
+                    ids = await self._stored_ids(pending)
+                    stored += [doc for doc in pending if doc["_id"] in ids]
+                    pending = [doc for doc in pending if doc["_id"] not in ids]
+                    if not pending:
+                        return stored
+                await self._collection.insert_many(pending, ordered=False)
+                return stored + pending
+            except BulkWriteError as e:
+                # Filas rechazadas por Mongo (p. ej. validación): no tiene sentido reintentarlas.
+                # Una clave duplicada (11000, solo en colecciones comunes) es una fila ya guardada, así que cuenta como insertada
+                failed = {
+                    err["index"] for err in e.details.get("writeErrors", []) if err.get("code") != DUPLICATE_KEY
+                }
+                if failed:
+                    self.dropped += len(failed)
+                    logger.error("Write-behind batch: %d readings rejected", len(failed))
+                return stored + [doc for i, doc in enumerate(pending) if i not in failed]
+            except Exception:
+                if attempt == self.retries:
+                    self.dropped += len(pending)
+                    logger.exception("Write-behind batch of %d readings lost", len(pending))
+                    return stored
+                logger.warning("Write-behind insert failed, retrying", exc_info=True)
+                await asyncio.sleep(min(2 ** attempt, 10))
+
+    async def _flush(self, batch):
+        try:
+            inserted = await self._insert(batch)
+            self.flushed += len(inserted)
+            if inserted:
+                await self._on_insert(inserted)
+        except Exception:
+            logger.exception("Error after write-behind insert")
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            await self._flush(batch)
+
+    # Al apagar: espera a que se inserte lo encolado (con límite de tiempo) y detiene el flusher
+    async def stop(self, timeout: float = WRITE_BEHIND_DRAIN_TIMEOUT):
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.error("Write-behind queue not drained, %d readings lost", self._queue.qsize())
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+
+ingest_queue = IngestQueue()
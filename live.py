@@ -0,0 +1,87 @@
+from bisect import insort
+import asyncio
+import os
+from streaming import dumps, row_to_dict
+from timeutils import to_utc_naive
+
+# Lecturas más recientes que se mantienen en memoria y tamaño de la cola de cada suscriptor
+LIVE_BUFFER_SIZE = int(os.getenv("LIVE_BUFFER_SIZE", "100"))
+LIVE_QUEUE_SIZE = int(os.getenv("LIVE_QUEUE_SIZE", "100"))
+# Cada cuántos segundos se envía un comentario SSE para mantener viva la conexión
+LIVE_HEARTBEAT = float(os.getenv("LIVE_HEARTBEAT", "15"))
+
+
+# Buffer de las N lecturas con timestamp más reciente y difusión de cada lectura nueva a los suscriptores.
+# Es por proceso: con varios workers cada uno ve solo lo que él mismo inserta, además del warm-up desde Mongo.
+class LiveFeed:
+    def __init__(self, buffer_size: int = LIVE_BUFFER_SIZE, queue_size: int = LIVE_QUEUE_SIZE):
+        self.buffer_size = buffer_size
+        self.queue_size = queue_size
+        self.warmed = False
+        self._counter = 0
+        # Lista ordenada de (timestamp, contador, documento); el contador desempata lecturas con igual timestamp
+        self._buffer = []
+        self._subscribers = set()
+
+    def _add(self, doc):
+        ts = doc.get("timestamp")
+        if ts is None:
+            return
+        self._counter += 1
+        entry = (to_utc_naive(ts), self._counter, doc)
+        if len(self._buffer) >= self.buffer_size and entry[:2] <= self._buffer[0][:2]:
+            return
+        insort(self._buffer, entry, key=lambda item: item[:2])
+        if len(self._buffer) > self.buffer_size:
+            del self._buffer[0]
+
+    # Carga las últimas lecturas desde Mongo al iniciar la API
+    async def warm(self, collection):
+        docs = await collection.find().sort("timestamp", -1).limit(self.buffer_size).to_list(length=self.buffer_size)
+        for doc in reversed(docs):
+            self._add(doc)
+        self.warmed = True
+
+    # Últimas `limit` lecturas, de la más reciente a la más antigua
+    def recent(self, limit: int = 10):
+        return [doc for _, _, doc in reversed(self._buffer[-limit:])]
+
+    # Agrega lecturas nuevas al buffer y las envía a cada suscriptor sin bloquear la ingesta:
+    # si la cola de un cliente lento está llena se descarta su lectura más antigua
+    def publish(self, docs):
+        for doc in docs:
+            self._add(doc)
+            if not self._subscribers:
+                continue
+            message = dumps(row_to_dict(doc)).decode("utf-8")
+            for queue in self._subscribers:
+                if queue.full():
+                    queue.get_nowait()
+                queue.put_nowait(message)
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    # Generador de eventos Server-Sent Events para un suscriptor
+    async def sse_events(self, request):
+        queue = self.subscribe()
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=LIVE_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"data: {message}\n\n"
+        finally:
+            self.unsubscribe(queue)
+
+
+live_feed = LiveFeed()
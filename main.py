@@ -1,18 +1,74 @@
-from fastapi import FastAPI, HTTPException, Depends, Header, Query
+from fastapi import FastAPI, HTTPException, Depends, Header, Query, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
+from fastapi.exceptions import RequestValidationError
+from fastapi.exception_handlers import request_validation_exception_handler
 from fastapi.middleware.cors import CORSMiddleware
 from datetime import datetime, timedelta
-from typing import List, Optional
+from typing import List, Literal, Optional
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
+import asyncio
 import os
-import pandas as pd
-import numpy as np
-import bcrypt
-from models.sensor_data import SensorData
+import json
+import math
+import zlib
+from models.sensor_data import SensorData, SENSOR_METRICS as METRICS
 from models.user import UserCreate, UserResponse
 from models.login import LoginData, LoginResponse
-from database import sensor_collection, users_collection 
+from database import sensor_collection, users_collection, ensure_indexes, connect as connect_db, close as close_db, ping as ping_db
+from rollups import update_rollups, query_rollups, ensure_rollup_indexes
+from sketches import SKETCH_RELATIVE_ACCURACY, ensure_sketch_indexes, merge_range, update_sketches
+from streaming import (
+    FAST_SERIALIZATION, MEDIA_TYPES, PAGE_PROJECTION, ROW_PROJECTION, STREAM_BATCH_SIZE,
+    encode_cursor, encode_json_rows, keyset_filter, range_filter, render_rows, resolve_format, stream_rows,
+)
+from cache import range_cache
+from live import live_feed
+from security import password_hasher, PasswordHasherBusy
+from metrics import MetricsMiddleware, StateCounters, stage_timer
+from export import EXPORT_FORMATS, open_export, stream_export
+from anomalies import anomaly_detector
+from devices import fleet_overview, update_latest
+from ingest_queue import WRITE_BEHIND, IngestQueueFull, ingest_queue
+from reports import REPORT_FORMATS, ReportTooLarge, clear_report_files, get_report, report_cache, shutdown_pool as shutdown_report_pool
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Gauge, generate_latest
+from contextlib import asynccontextmanager
+import logging
 import jwt
 
-app = FastAPI()
+logger = logging.getLogger(__name__)
+
+
+# Al iniciar: crea el cliente de Mongo, asegura los índices (y la colección time-series si está activada)
+# y carga las últimas lecturas
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    connect_db()
+    if not await ping_db():
+        logger.error("MongoDB is not reachable at startup")
+    try:
+        await ensure_indexes()
+        await ensure_rollup_indexes()
+        await ensure_sketch_indexes()
+    except Exception:
+        logger.exception("Error creating indexes")
+    try:
+        await live_feed.warm(sensor_collection)
+    except Exception:
+        logger.exception("Error loading recent readings")
+    # Los reportes de una ejecución anterior ya no están en el cache
+    clear_report_files()
+    if WRITE_BEHIND:
+        ingest_queue.start(sensor_collection, _after_insert)
+    yield
+    # Primero se vacía la cola de escritura diferida, que todavía usa Mongo y los caches
+    await ingest_queue.stop()
+    password_hasher.shutdown()
+    shutdown_report_pool()
+    clear_report_files()
+    close_db()
+
+app = FastAPI(lifespan=lifespan)
 
 origins = [
     "http://localhost:5173",  # Origen de tu app React
@@ -27,12 +83,44 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Permitir todos los métodos (GET, POST, etc.)
     allow_headers=["*"],  # Permitir todos los encabezados
+    expose_headers=["X-Next-Cursor", "X-Source-Points"],  # Cursor de paginación y lecturas originales de /sensor-data/range
 )
+app.add_middleware(MetricsMiddleware)
+
+# El 422 repite el valor recibido, y NaN o infinito no se pueden escribir en JSON: se devuelven como texto
+@app.exception_handler(RequestValidationError)
+async def validation_exception_handler(request: Request, exc: RequestValidationError):
+    errors = [
+        {**err, "input": str(err["input"])}
+        if isinstance(err.get("input"), float) and not math.isfinite(err["input"]) else err
+        for err in exc.errors()
+    ]
+    return await request_validation_exception_handler(request, RequestValidationError(errors, body=exc.body))
+
+# Estado interno de la API que se lee al momento de exponer /metrics
+REGISTRY.register(StateCounters([
+    ("range_cache_hits", "Aciertos del cache de rangos", lambda: range_cache.hits),
+    ("range_cache_misses", "Fallos del cache de rangos", lambda: range_cache.misses),
+    ("write_behind_flushed", "Lecturas insertadas por la cola de escritura diferida", lambda: ingest_queue.flushed),
+    ("write_behind_dropped", "Lecturas de la cola que no se pudieron insertar", lambda: ingest_queue.dropped),
+]))
+Gauge("range_cache_entries", "Entradas en el cache de rangos").set_function(lambda: len(range_cache))
+Gauge("bcrypt_pending", "Operaciones de bcrypt en curso o en espera").set_function(lambda: password_hasher.pending)
+Gauge("write_behind_pending", "Lecturas encoladas sin insertar").set_function(lambda: ingest_queue.pending)
 
 
 # Cargar la API Key desde las variables de entorno
 API_KEY = os.getenv("API_KEY")
 SECRET_KEY = os.getenv("SECRET_KEY", "mysecretkey") 
+# Cantidad de filas que se validan e insertan juntas en /sensor-data/batch
+BATCH_CHUNK_SIZE = int(os.getenv("BATCH_CHUNK_SIZE", "500"))
+# Tamaño máximo del cuerpo de /sensor-data/batch ya descomprimido, y de cada paso de descompresión
+MAX_BATCH_BODY_BYTES = int(os.getenv("MAX_BATCH_BODY_BYTES", str(64 * 1024 * 1024)))
+BATCH_INFLATE_STEP = 1024 * 1024
+# Tamaño máximo de página en /sensor-data/range
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "10000"))
+# Máximo de puntos por métrica que se puede pedir con points= en /sensor-data/range
+MAX_DOWNSAMPLE_POINTS = int(os.getenv("MAX_DOWNSAMPLE_POINTS", "5000"))
 
 # Dependencia para verificar la API Key
 async def verify_api_key(x_api_key: str = Header(...)):
@@ -41,119 +129,547 @@ async def verify_api_key(x_api_key: str = Header(...)):
 
 
 
-# Endpoint para agregar datos del sensor a la colección "sensor"
+DERIVED_UPDATE_ERRORS = ("Error updating rollups", "Error updating percentile sketches", "Error updating latest readings")
+
+# Tareas derivadas de cada inserción (rollups, etc.); un fallo aquí no invalida la lectura ya guardada
+async def _after_insert(docs):
+    range_cache.invalidate(doc.get("timestamp") for doc in docs)
+    report_cache.invalidate(doc.get("timestamp") for doc in docs)
+    live_feed.publish(docs)
+    anomaly_detector.observe_many(docs)
+    # Rollups, sketches y última lectura por placa son independientes: se escriben en paralelo
+    results = await asyncio.gather(
+        update_rollups(docs), update_sketches(docs), update_latest(docs), return_exceptions=True
+    )
+    for message, result in zip(DERIVED_UPDATE_ERRORS, results):
+        if isinstance(result, Exception):
+            logger.error(message, exc_info=result)
+
+
+# Endpoint para agregar datos del sensor a la colección "sensor".
+# Con WRITE_BEHIND la lectura se encola y se responde 202; el flusher la inserta en lote
 @app.post("/sensor-data", dependencies=[Depends(verify_api_key)])
-async def add_sensor_data(data: SensorData):
+async def add_sensor_data(data: SensorData, response: Response):
     try:
+        doc = data.dict()
+        if ingest_queue.running:
+            ingest_queue.put(doc)
+            response.status_code = 202
+            return {"status": "Data queued"}
+
         # Inserta los datos en la colección "sensor"
-        result = await sensor_collection.insert_one(data.dict())
+        result = await sensor_collection.insert_one(doc)
+        await _after_insert([doc])
         return {"status": "Data inserted", "id": str(result.inserted_id)}
+    except IngestQueueFull:
+        raise HTTPException(status_code=429, detail="Ingest queue full, try again later",
+                            headers={"Retry-After": str(ingest_queue.retry_after)})
     except Exception as e:
         raise HTTPException(status_code=500, detail="Error inserting data")
 
 
 
+def _body_too_large():
+    return HTTPException(status_code=413, detail=f"Batch body exceeds {MAX_BATCH_BODY_BYTES} bytes")
+
+# Descomprime `data` en trozos de a lo sumo BATCH_INFLATE_STEP bytes, cortando con 413 si el total
+# descomprimido supera MAX_BATCH_BODY_BYTES (un gzip chico puede expandirse a gigabytes)
+def _inflate(decompressor, data: bytes, inflated: int):
+    while data:
+        try:
+            part = decompressor.decompress(data, BATCH_INFLATE_STEP)
+        except zlib.error:
+            raise HTTPException(status_code=400, detail="Invalid gzip body")
+        inflated += len(part)
+        if inflated > MAX_BATCH_BODY_BYTES:
+            raise _body_too_large()
+        yield part, inflated
+        data = decompressor.unconsumed_tail
+
+# Descomprime todo el cuerpo gzip (acotado por MAX_BATCH_BODY_BYTES) y verifica que el stream esté completo.
+# Se hace antes de insertar la primera fila: un gzip cortado devuelve 400 sin haber guardado nada,
+# así el cliente puede reenviar el lote entero sin duplicar lecturas (en time-series no hay _id único)
+async def _inflate_body(request: Request, decompressor) -> bytes:
+    body = bytearray()
+    async for chunk in request.stream():
+        for part, _ in _inflate(decompressor, chunk, len(body)):
+            body += part
+    if not decompressor.eof:
+        raise HTTPException(status_code=400, detail="Truncated gzip body")
+    return bytes(body)
+
+# Recorre el cuerpo de /sensor-data/batch devolviendo (índice, fila); un NDJSON sin comprimir se procesa
+# a medida que llega, sin cargarlo completo en memoria. Acepta el cuerpo comprimido con Content-Encoding: gzip
+async def _iter_batch_rows(request: Request):
+    content_type = request.headers.get("content-type", "")
+    gzipped = request.headers.get("content-encoding", "").lower() == "gzip"
+    decompressor = zlib.decompressobj(wbits=zlib.MAX_WBITS | 16) if gzipped else None
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        if decompressor:
+            lines = (await _inflate_body(request, decompressor)).split(b"\n")
+            for index, line in enumerate(line for line in lines if line.strip()):
+                yield index, line
+            return
+        index = 0
+        size = 0
+        buffer = b""
+        async for chunk in request.stream():
+            size += len(chunk)
+            if size > MAX_BATCH_BODY_BYTES:
+                raise _body_too_large()
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield index, line
+                    index += 1
+        if buffer.strip():
+            yield index, buffer
+        return
+
+    if decompressor:
+        body = await _inflate_body(request, decompressor)
+    else:
+        body = await request.body()
+        if len(body) > MAX_BATCH_BODY_BYTES:
+            raise _body_too_large()
+    try:
+        rows = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON body")
+    if not isinstance(rows, list):
+        raise HTTPException(status_code=400, detail="Body must be a JSON array")
+    for index, row in enumerate(rows):
+        yield index, row
+
+# Valida una fila del lote; devuelve (documento, None) o (None, error)
+def _validate_batch_row(row):
+    if isinstance(row, bytes):
+        try:
+            row = json.loads(row)
+        except ValueError:
+            return None, "Invalid JSON"
+    if not isinstance(row, dict):
+        return None, "Row must be a JSON object"
+    try:
+        return SensorData(**row).dict(), None
+    except ValidationError as e:
+        return None, "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+
+# Inserta un bloque de filas válidas sin orden, reportando las que Mongo rechace
+async def _insert_batch_chunk(chunk):
+    docs = [doc for _, doc in chunk]
+    try:
+        result = await sensor_collection.insert_many(docs, ordered=False)
+        await _after_insert(docs)
+        return len(result.inserted_ids), []
+    except BulkWriteError as e:
+        write_errors = e.details.get("writeErrors", [])
+        failed = {err["index"] for err in write_errors}
+        rejected = [
+            {"index": chunk[err["index"]][0], "error": err.get("errmsg", "Write error")}
+            for err in write_errors
+        ]
+        await _after_insert([doc for i, doc in enumerate(docs) if i not in failed])
+        return e.details.get("nInserted", len(docs) - len(write_errors)), rejected
+
+# Endpoint para agregar lecturas en lote (arreglo JSON o flujo NDJSON)
+@app.post("/sensor-data/batch", dependencies=[Depends(verify_api_key)])
+async def add_sensor_data_batch(request: Request):
+    inserted = 0
+    rejected = []
+    chunk = []
+    try:
+        async for index, row in _iter_batch_rows(request):
+            doc, error = _validate_batch_row(row)
+            if error:
+                rejected.append({"index": index, "error": error})
+                continue
+            chunk.append((index, doc))
+            if len(chunk) >= BATCH_CHUNK_SIZE:
+                count, chunk_rejected = await _insert_batch_chunk(chunk)
+                inserted += count
+                rejected.extend(chunk_rejected)
+                chunk = []
+        if chunk:
+            count, chunk_rejected = await _insert_batch_chunk(chunk)
+            inserted += count
+            rejected.extend(chunk_rejected)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="Error inserting batch data")
+
+    return {"status": "Batch processed", "inserted": inserted, "rejected": rejected}
+
+
 # Endpoint para obtener las últimas 10 inserciones
 @app.get("/sensor-data/recent", response_model=List[SensorData] )
-async def get_recent_sensor_data():
+async def get_recent_sensor_data(
+    device_id: Optional[str] = Query(None, description="Filtrar por placa")
+):
     try:
-        # Obtiene los últimos 10 documentos, ordenados por timestamp en orden descendente
-        recent_data = await sensor_collection.find().sort("timestamp", -1).limit(10).to_list(length=10)
+        # Se sirve desde el buffer en memoria; solo se consulta Mongo si no se pudo cargar al iniciar.
+        # El buffer mezcla todas las placas, así que con device_id se consulta Mongo (índice (device_id, timestamp))
+        if live_feed.warmed and device_id is None:
+            recent_data = live_feed.recent(10)
+        else:
+            # Obtiene los últimos 10 documentos, ordenados por timestamp en orden descendente
+            query = {} if device_id is None else {"device_id": device_id}
+            recent_data = await sensor_collection.find(query, ROW_PROJECTION).sort("timestamp", -1).limit(10).to_list(length=10)
+
+        if FAST_SERIALIZATION:
+            return Response(content=encode_json_rows(recent_data), media_type="application/json")
         return recent_data
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error inserting data: {str(e)}")
+
+
+# Endpoint Server-Sent Events que envía cada lectura nueva a los clientes conectados
+@app.get("/sensor-data/stream")
+async def stream_sensor_data(request: Request):
+    return StreamingResponse(
+        live_feed.sse_events(request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
         
 
+# Calcula en Mongo, en una sola pasada, count/min/max/mean/stddev de cada métrica en el rango
+async def _aggregate_range_stats(start_date: datetime, end_date: datetime, device_id: Optional[str] = None):
+    group = {"_id": None, "count": {"$sum": 1}}
+    for metric in METRICS:
+        group[f"{metric}_count"] = {"$sum": {"$cond": [{"$isNumber": f"${metric}"}, 1, 0]}}
+        group[f"{metric}_min"] = {"$min": f"${metric}"}
+        group[f"{metric}_max"] = {"$max": f"${metric}"}
+        group[f"{metric}_mean"] = {"$avg": f"${metric}"}
+        group[f"{metric}_stddev"] = {"$stdDevPop": f"${metric}"}
+
+    pipeline = [
+        {"$match": range_filter(start_date, end_date, device_id)},
+        {"$group": group},
+    ]
+    with stage_timer("range_stats", "aggregate"):
+        result = await sensor_collection.aggregate(pipeline).to_list(length=1)
+    return result[0] if result else None
+
+# Igual que _aggregate_range_stats pero pasando por el cache de rangos (compartido por /average, /max y /stats)
+# La placa va en el nombre de la entrada para que cada una tenga su propio resultado
+async def _cached_range_stats(start_date: datetime, end_date: datetime, device_id: Optional[str] = None):
+    key = "range_stats" if device_id is None else f"range_stats:{device_id}"
+    found, stats = range_cache.get(key, start_date, end_date)
+    if not found:
+        pending = range_cache.begin()
+        try:
+            stats = await _aggregate_range_stats(start_date, end_date, device_id)
+        finally:
+            range_cache.done(pending)
+        range_cache.set(key, start_date, end_date, stats, pending)
+    return stats
+
 # Endpoint para obtener el promedio de temperatura y CO2 en un rango de fechas
 @app.get("/sensor-data/average", dependencies=[Depends(verify_api_key)])
 async def get_average_sensor_data(
     start_date: datetime = Query(..., description="Fecha de inicio"),
-    end_date: datetime = Query(..., description="Fecha de fin")
+    end_date: datetime = Query(..., description="Fecha de fin"),
+    device_id: Optional[str] = Query(None, description="Filtrar por placa")
 ):
     try:
-        # Filtra los datos en el rango de fechas especificado
-        data = await sensor_collection.find({
-            "timestamp": {"$gte": start_date, "$lte": end_date}
-        }).to_list(length=None)
+        # Calcula los promedios directamente en Mongo
+        stats = await _cached_range_stats(start_date, end_date, device_id)
         
-        if not data:
+        if not stats:
             raise HTTPException(status_code=404, detail="No data found in the given date range")
-        
-        # Convierte los datos en un DataFrame de Pandas
-        df = pd.DataFrame(data)
-        
-        # Calcula los promedios usando pandas
-        avg_temperature = df["temperature"].mean()
-        avg_noise = df["noise"].mean()
-        avg_light = df["light"].mean()
 
         return {
-            "average_temperature": avg_temperature,
-            "average_noise": avg_noise,
-            "average_light": avg_light,
+            "average_temperature": stats["temperature_mean"],
+            "average_noise": stats["noise_mean"],
+            "average_light": stats["light_mean"],
             "start_date": start_date,
             "end_date": end_date
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail="Error calculating average data")
 
 # Endpoint para obtener todos los datos en un rango de fechas
+# Con format=ndjson|csv (o cabecera Accept) la respuesta se envía en streaming; con limit se pagina por (timestamp, _id).
+# Con points se reduce el rango con LTTB a unos `points` puntos por métrica (para gráficos)
 @app.get("/sensor-data/range", response_model=List[SensorData], dependencies=[Depends(verify_api_key)])
 async def get_sensor_data_in_range(
+    request: Request,
+    response: Response,
     start_date: datetime = Query(..., description="Fecha de inicio"),
-    end_date: datetime = Query(..., description="Fecha de fin")
+    end_date: datetime = Query(..., description="Fecha de fin"),
+    format: Optional[Literal["json", "ndjson", "csv"]] = Query(None, description="Formato de salida"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Cantidad máxima de filas por página"),
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente (cabecera X-Next-Cursor)"),
+    device_id: Optional[str] = Query(None, description="Filtrar por placa"),
+    points: Optional[int] = Query(None, ge=10, le=MAX_DOWNSAMPLE_POINTS, description="Puntos por métrica (LTTB)")
 ):
+    if points is not None and (limit is not None or cursor):
+        raise HTTPException(status_code=400, detail="points cannot be combined with limit or cursor")
+    if cursor and limit is None:
+        raise HTTPException(status_code=400, detail="cursor requires limit")
+    output_format = resolve_format(format, request.headers.get("accept", ""))
+    query = range_filter(start_date, end_date, device_id)
+    if cursor:
+        try:
+            query = keyset_filter(query, cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
     try:
-        # Filtra los datos en el rango de fechas especificado
-        data = await sensor_collection.find({
-            "timestamp": {"$gte": start_date, "$lte": end_date}
-        }).to_list(length=None)
-        
-        if not data:
+        if limit is None and points is None and output_format != "json":
+            # Streaming de todo el rango sin cargarlo en memoria, en el mismo orden que las páginas.
+            # Se lee la primera fila antes de responder para devolver 404 si el rango está vacío, como en JSON
+            db_cursor = sensor_collection.find(query, ROW_PROJECTION).sort(
+                [("timestamp", 1), ("_id", 1)]
+            ).batch_size(STREAM_BATCH_SIZE)
+            first = await anext(db_cursor, None)
+            if first is None:
+                raise HTTPException(status_code=404, detail="No data found in the given date range")
+            return StreamingResponse(stream_rows(db_cursor, output_format, first), media_type=MEDIA_TYPES[output_format])
+
+        headers = {}
+        if points is not None:
+            # numpy se carga recién con el primer pedido que usa points
+            from downsample import downsample_range
+
+            with stage_timer("range", "downsample"):
+                data, total = await downsample_range(sensor_collection, query, points)
+            headers["X-Source-Points"] = str(total)
+        else:
+            with stage_timer("range", "fetch"):
+                if limit is None:
+                    # Filtra los datos en el rango de fechas especificado
+                    data = await sensor_collection.find(query, ROW_PROJECTION).sort(
+                        [("timestamp", 1), ("_id", 1)]
+                    ).to_list(length=None)
+                else:
+                    # Pide una fila extra para saber si hay página siguiente
+                    data = await sensor_collection.find(query, PAGE_PROJECTION).sort(
+                        [("timestamp", 1), ("_id", 1)]
+                    ).limit(limit + 1).to_list(length=limit + 1)
+
+            if limit is not None and len(data) > limit:
+                data = data[:limit]
+                headers["X-Next-Cursor"] = encode_cursor(data[-1])
+
+        if not data and cursor is None:
             raise HTTPException(status_code=404, detail="No data found in the given date range")
-        
+
+        if output_format != "json":
+            with stage_timer("range", "render"):
+                content = render_rows(data, output_format)
+            return Response(content=content, media_type=MEDIA_TYPES[output_format], headers=headers)
+
         # Devuelve todos los datos encontrados en el rango de fechas
+        if FAST_SERIALIZATION:
+            with stage_timer("range", "render"):
+                content = encode_json_rows(data)
+            return Response(content=content, media_type="application/json", headers=headers)
+        response.headers.update(headers)
         return data
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail="Error retrieving data")
 
 
 
+# Endpoint para exportar un rango en formato columnar (Parquet o Arrow IPC) para análisis
+@app.get("/sensor-data/export", dependencies=[Depends(verify_api_key)])
+async def export_sensor_data(
+    start_date: datetime = Query(..., description="Fecha de inicio"),
+    end_date: datetime = Query(..., description="Fecha de fin"),
+    format: Literal["parquet", "arrow"] = Query("parquet", description="Formato del archivo"),
+    device_id: Optional[str] = Query(None, description="Filtrar por placa")
+):
+    media_type, extension = EXPORT_FORMATS[format]
+    filename = f"sensor_{start_date:%Y%m%d%H%M%S}_{end_date:%Y%m%d%H%M%S}.{extension}"
+    query = range_filter(start_date, end_date, device_id)
+    try:
+        cursor, first = await open_export(sensor_collection, query)
+        if first is None:
+            raise HTTPException(status_code=404, detail="No data found in the given date range")
+        return StreamingResponse(
+            stream_export(cursor, first, format),
+            media_type=media_type,
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="Error exporting data")
+
+
+# Endpoint para descargar un reporte XLSX o CSV del rango (una fila por lectura y el promedio al final).
+# Se genera en un pool de procesos y queda en cache hasta que llegue una lectura dentro del rango
+@app.get("/sensor-data/report", dependencies=[Depends(verify_api_key)])
+async def get_sensor_data_report(
+    start_date: datetime = Query(..., description="Fecha de inicio"),
+    end_date: datetime = Query(..., description="Fecha de fin"),
+    format: Literal["xlsx", "csv"] = Query("xlsx", description="Formato del reporte")
+):
+    try:
+        path = await get_report(sensor_collection, start_date, end_date, format)
+
+        if not path:
+            raise HTTPException(status_code=404, detail="No data found in the given date range")
+
+        filename = f"mediciones_{start_date:%Y%m%d%H%M%S}_{end_date:%Y%m%d%H%M%S}.{format}"
+        return FileResponse(path, media_type=REPORT_FORMATS[format], filename=filename)
+    except ReportTooLarge:
+        raise HTTPException(status_code=400, detail="Range too large for a report, use /sensor-data/export")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="Error generating report")
+
+
 # Endpoint para obtener el valor máximo de temperatura y CO2 en un rango de fechas
 @app.get("/sensor-data/max", dependencies=[Depends(verify_api_key)])
 async def get_max_sensor_data(
     start_date: datetime = Query(..., description="Fecha de inicio"),
-    end_date: datetime = Query(..., description="Fecha de fin")
+    end_date: datetime = Query(..., description="Fecha de fin"),
+    device_id: Optional[str] = Query(None, description="Filtrar por placa")
 ):
     try:
-        # Filtra los datos en el rango de fechas especificado
-        data = await sensor_collection.find({
-            "timestamp": {"$gte": start_date, "$lte": end_date}
-        }).to_list(length=None)
+        # Calcula los máximos directamente en Mongo
+        stats = await _cached_range_stats(start_date, end_date, device_id)
         
-        if not data:
+        if not stats:
             raise HTTPException(status_code=404, detail="No data found in the given date range")
-        
-        # Convierte los datos en un DataFrame de Pandas
-        df = pd.DataFrame(data)
-        
-        # Encuentra los valores máximos usando pandas
-        max_temperature = df["temperature"].max()
-        max_noise = df["noise"].max()
-        max_light = df["light"].max()
-
 
         return {
-            "max_temperature": max_temperature,
-            "max_noise": max_noise,
-            "max_light": max_light,
+            "max_temperature": stats["temperature_max"],
+            "max_noise": stats["noise_max"],
+            "max_light": stats["light_max"],
             "start_date": start_date,
             "end_date": end_date
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail="Error retrieving max data")
 
 
+# Endpoint para obtener count/min/max/mean/stddev de cada métrica en un rango de fechas
+@app.get("/sensor-data/stats", dependencies=[Depends(verify_api_key)])
+async def get_sensor_data_stats(
+    start_date: datetime = Query(..., description="Fecha de inicio"),
+    end_date: datetime = Query(..., description="Fecha de fin"),
+    device_id: Optional[str] = Query(None, description="Filtrar por placa")
+):
+    try:
+        stats = await _cached_range_stats(start_date, end_date, device_id)
+
+        if not stats:
+            raise HTTPException(status_code=404, detail="No data found in the given date range")
+
+        response = {"count": stats["count"], "start_date": start_date, "end_date": end_date}
+        for metric in METRICS:
+            response[metric] = {
+                "count": stats[f"{metric}_count"],
+                "min": stats[f"{metric}_min"],
+                "max": stats[f"{metric}_max"],
+                "mean": stats[f"{metric}_mean"],
+                "stddev": stats[f"{metric}_stddev"],
+            }
+        return response
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="Error calculating stats data")
+
+
+# Endpoint para obtener percentiles de cada métrica en un rango de fechas.
+# Combina los sketches por hora (error relativo de SKETCH_RELATIVE_ACCURACY) en lugar de leer cada lectura
+@app.get("/sensor-data/percentiles", dependencies=[Depends(verify_api_key)])
+async def get_sensor_data_percentiles(
+    start_date: datetime = Query(..., description="Fecha de inicio"),
+    end_date: datetime = Query(..., description="Fecha de fin"),
+    q: List[float] = Query([0.5, 0.95, 0.99], description="Cuantiles a calcular (0 a 1)")
+):
+    if any(not 0 <= quantile <= 1 for quantile in q):
+        raise HTTPException(status_code=400, detail="Quantiles must be between 0 and 1")
+
+    try:
+        sketches = await merge_range(start_date, end_date)
+
+        if not sketches:
+            raise HTTPException(status_code=404, detail="No data found in the given date range")
+
+        response = {"start_date": start_date, "end_date": end_date, "relative_accuracy": SKETCH_RELATIVE_ACCURACY}
+        for metric in METRICS:
+            sketch = sketches.get(metric)
+            response[metric] = None if sketch is None else {
+                "count": sketch.count,
+                **{f"p{quantile * 100:g}": sketch.quantile(quantile) for quantile in q},
+            }
+        return response
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="Error calculating percentiles")
+
+
+# Endpoint para consultar los rollups precalculados (minuto/hora/día) en un rango de fechas
+@app.get("/sensor-data/rollup", dependencies=[Depends(verify_api_key)])
+async def get_sensor_data_rollup(
+    resolution: Literal["minute", "hour", "day"] = Query("hour", description="Resolución del bucket"),
+    start_date: datetime = Query(..., description="Fecha de inicio"),
+    end_date: datetime = Query(..., description="Fecha de fin")
+):
+    try:
+        buckets = await query_rollups(resolution, start_date, end_date)
+
+        if not buckets:
+            raise HTTPException(status_code=404, detail="No data found in the given date range")
+
+        return {
+            "resolution": resolution,
+            "start_date": start_date,
+            "end_date": end_date,
+            "buckets": buckets
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="Error retrieving rollup data")
+
+
+# Endpoint con la última lectura de cada placa, para la vista general de la flota
+@app.get("/devices", dependencies=[Depends(verify_api_key)])
+async def get_devices():
+    try:
+        devices = await fleet_overview()
+        return {"count": len(devices), "devices": devices}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="Error retrieving devices")
+
+
+# Endpoint para consultar los contadores del cache de rangos
+@app.get("/cache/stats", dependencies=[Depends(verify_api_key)])
+async def get_cache_stats():
+    return range_cache.stats()
+
+
+# Endpoint con las últimas alertas del detector de anomalías (la más reciente primero)
+@app.get("/alerts", dependencies=[Depends(verify_api_key)])
+async def get_alerts(
+    limit: int = Query(100, ge=1, le=1000, description="Cantidad máxima de alertas"),
+    metric: Optional[Literal["temperature", "noise", "light"]] = Query(None, description="Filtrar por métrica"),
+    device_id: Optional[str] = Query(None, description="Filtrar por placa")
+):
+    return {
+        "observed": anomaly_detector.observed,
+        "alerts": anomaly_detector.recent(limit, metric, device_id),
+    }
+
+
 # Endpoint para crear una cuenta
 @app.post("/users", response_model=UserResponse)
 async def create_user(user: UserCreate):
@@ -163,15 +679,19 @@ async def create_user(user: UserCreate):
         if existing_user:
             raise HTTPException(status_code=400, detail="Email already registered")
 
-        # Encripta la contraseña
-        hashed_password = bcrypt.hashpw(user.password.encode("utf-8"), bcrypt.gensalt())
+        # Encripta la contraseña (en el pool de bcrypt, fuera del event loop)
+        hashed_password = await password_hasher.hash(user.password)
 
         # Crea el usuario en la base de datos
-        user_data = {"email": user.email, "password": hashed_password.decode("utf-8")}
+        user_data = {"email": user.email, "password": hashed_password}
         result = await users_collection.insert_one(user_data)
 
         # Devuelve el usuario creado (sin contraseña)
         return {"id": str(result.inserted_id), "email": user.email}
+    except PasswordHasherBusy:
+        raise HTTPException(status_code=503, detail="Too many concurrent requests, try again later", headers={"Retry-After": "1"})
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail="Error creating user")
 
@@ -184,8 +704,8 @@ async def login(data: LoginData):
         if not user:
             raise HTTPException(status_code=401, detail="Invalid email or password")
 
-        # Verifica la contraseña
-        is_valid_password = bcrypt.checkpw(data.password.encode("utf-8"), user["password"].encode("utf-8"))
+        # Verifica la contraseña (en el pool de bcrypt, fuera del event loop)
+        is_valid_password = await password_hasher.verify(data.password, user["password"])
         if not is_valid_password:
             raise HTTPException(status_code=401, detail="Invalid email or password")
 
@@ -198,9 +718,25 @@ async def login(data: LoginData):
         token = jwt.encode(payload, SECRET_KEY, algorithm="HS256")
 
         return {"access_token": token, "token_type": "bearer"}
+    except PasswordHasherBusy:
+        raise HTTPException(status_code=503, detail="Too many concurrent requests, try again later", headers={"Retry-After": "1"})
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail="Error during login")
 
+# Endpoint con las métricas en formato Prometheus
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+# Readiness check: 200 si Mongo responde, 503 si no (para el healthcheck del despliegue)
+@app.get("/health/ready", include_in_schema=False)
+async def readiness():
+    if not await ping_db():
+        raise HTTPException(status_code=503, detail="Database not reachable")
+    return {"status": "ready"}
+
 @app.get("/")
 async def read_root():
     return { "api": "TIC API", "version": "0.5" }
@@ -0,0 +1,132 @@
+from contextlib import contextmanager
+from pymongo import monitoring
+from prometheus_client import Counter, Gauge, Histogram
+from prometheus_client.core import CounterMetricFamily
+from starlette.routing import Match
+import os
+import time
+
+# Timers por etapa dentro de los handlers (desactivados por defecto)
+METRICS_STAGE_TIMERS = os.getenv("METRICS_STAGE_TIMERS", "false").lower() in ("1", "true", "yes")
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Latencia de las peticiones HTTP por ruta",
+    ["method", "route", "status"],
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "Peticiones HTTP en curso por ruta",
+    ["method", "route"],
+)
+MONGO_COMMAND_LATENCY = Histogram(
+    "mongodb_command_duration_seconds",
+    "Duración de cada comando enviado a MongoDB",
+    ["command"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+MONGO_COMMAND_FAILURES = Counter(
+    "mongodb_command_failures_total",
+    "Comandos de MongoDB que fallaron",
+    ["command"],
+)
+MONGO_DOCUMENTS_RETURNED = Counter(
+    "mongodb_documents_returned_total",
+    "Documentos devueltos por MongoDB en find/getMore/aggregate",
+    ["command"],
+)
+STAGE_LATENCY = Histogram(
+    "api_stage_duration_seconds",
+    "Duración de las etapas internas de los handlers",
+    ["handler", "stage"],
+)
+
+
+# Mide un bloque de código de un handler; no hace nada si METRICS_STAGE_TIMERS está desactivado
+@contextmanager
+def stage_timer(handler: str, stage: str):
+    if not METRICS_STAGE_TIMERS:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_LATENCY.labels(handler, stage).observe(time.perf_counter() - started)
+
+
+# Expone como Counter contadores que ya lleva otro objeto (cache, cola...): se leen al momento de /metrics.
+# `counters` es una lista de (nombre, descripción, función que devuelve el valor); el sufijo _total lo agrega
+# prometheus_client. Con Gauge.set_function perderían el tipo y rate() no los trataría como monótonos
+class StateCounters:
+    def __init__(self, counters):
+        self.counters = counters
+
+    def collect(self):
+        for name, documentation, value in self.counters:
+            yield CounterMetricFamily(name, documentation, value=value())
+
+
+# Listener de PyMongo: tiempo por comando y documentos devueltos, sin tocar el código de las consultas
+class MongoCommandMetrics(monitoring.CommandListener):
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        MONGO_COMMAND_LATENCY.labels(event.command_name).observe(event.duration_micros / 1_000_000)
+        cursor = event.reply.get("cursor") if isinstance(event.reply, dict) else None
+        if cursor:
+            batch = cursor.get("firstBatch", cursor.get("nextBatch"))
+            if batch:
+                MONGO_DOCUMENTS_RETURNED.labels(event.command_name).inc(len(batch))
+
+    def failed(self, event):
+        MONGO_COMMAND_LATENCY.labels(event.command_name).observe(event.duration_micros / 1_000_000)
+        MONGO_COMMAND_FAILURES.labels(event.command_name).inc()
+
+
+# Middleware ASGI que registra latencia y peticiones en curso por plantilla de ruta (no por URL,
+# para no crear una serie por cada combinación de parámetros)
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+        self._routes = {}
+
+    def _route_for(self, scope):
+        key = (scope["method"], scope["path"])
+        route = self._routes.get(key)
+        if route is None:
+            router = scope["app"].router
+            for candidate in router.routes:
+                match, _ = candidate.matches(scope)
+                if match == Match.FULL:
+                    route = candidate.path
+                    # Solo se cachean rutas existentes, así las URL aleatorias (404) no hacen crecer el dict
+                    self._routes[key] = route
+                    break
+            else:
+                route = "unmatched"
+        return route
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = self._route_for(scope)
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        in_flight = REQUESTS_IN_FLIGHT.labels(method, route)
+        in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUEST_LATENCY.labels(method, route, str(status["code"])).observe(time.perf_counter() - started)
+            in_flight.dec()
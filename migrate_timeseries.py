@@ -0,0 +1,57 @@
+from database import db, ensure_indexes, ensure_timeseries_collection, TIMESERIES_COLLECTION
+import argparse
+import asyncio
+
+# Copia la colección "sensor" a la colección time-series en lotes.
+# Uso: SENSOR_TIMESERIES=true python migrate_timeseries.py [--batch-size 5000] [--drop-source]
+
+
+async def migrate(batch_size: int, drop_source: bool):
+    source = db["sensor"]
+    target = db[TIMESERIES_COLLECTION]
+
+    await ensure_timeseries_collection()
+
+    copied = 0
+    batch = []
+    # _id se conserva para que volver a ejecutar la migración no duplique documentos ya copiados.
+    # En orden de fecha (índice (timestamp, _id)) cada lote cubre un tramo corto de tiempo
+    cursor = source.find({"timestamp": {"$type": "date"}}).sort([("timestamp", 1), ("_id", 1)]).batch_size(batch_size)
+    async for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            copied += await _copy_batch(target, batch)
+            batch = []
+    if batch:
+        copied += await _copy_batch(target, batch)
+
+    await ensure_indexes()
+    print(f"Documentos copiados a '{TIMESERIES_COLLECTION}': {copied}")
+
+    if drop_source:
+        source_count = await source.count_documents({})
+        target_count = await target.count_documents({})
+        if target_count < source_count:
+            print("La colección destino tiene menos documentos que el origen; no se elimina 'sensor'")
+            return
+        await source.drop()
+        print("Colección 'sensor' eliminada")
+
+
+# La colección time-series no tiene índice por _id: los ya copiados se buscan por el tramo de fechas del lote,
+# que Mongo resuelve con los límites de tiempo de cada bucket sin recorrer toda la colección
+async def _copy_batch(target, batch):
+    window = {"$gte": batch[0]["timestamp"], "$lte": batch[-1]["timestamp"]}
+    existing = {doc["_id"] async for doc in target.find({"timestamp": window}, {"_id": 1})}
+    pending = [doc for doc in batch if doc["_id"] not in existing]
+    if pending:
+        await target.insert_many(pending, ordered=False)
+    return len(pending)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migra la colección 'sensor' a una colección time-series")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--drop-source", action="store_true", help="Elimina 'sensor' al terminar la copia")
+    args = parser.parse_args()
+    asyncio.run(migrate(args.batch_size, args.drop_source))
@@ -1,8 +1,16 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
 from typing import Optional
+
+# Métricas numéricas de cada lectura
+SENSOR_METRICS = ("temperature", "noise", "light")
+
 class SensorData(BaseModel):
-    temperature: Optional[float] = None
-    noise: Optional[float]
-    light: Optional[float] = None
-    timestamp: datetime = datetime.now()
\ No newline at end of file
+    # NaN e infinito se rechazan: romperían las sumas de los rollups, los sketches y el estado de las anomalías
+    temperature: Optional[float] = Field(default=None, allow_inf_nan=False)
+    noise: Optional[float] = Field(allow_inf_nan=False)
+    light: Optional[float] = Field(default=None, allow_inf_nan=False)
+    # default_factory para que cada lectura tome la hora en que se crea y no la de importación
+    timestamp: datetime = Field(default_factory=datetime.now)
+    # Placa que tomó la lectura; las lecturas anteriores a varias placas no lo tienen
+    device_id: Optional[str] = Field(default=None, min_length=1, max_length=64)
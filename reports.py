@@ -0,0 +1,191 @@
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import asyncio
+import csv
+import hashlib
+import multiprocessing
+import os
+import tempfile
+import uuid
+from cache import RangeCache
+from models.sensor_data import SENSOR_METRICS
+from streaming import ROW_PROJECTION
+
+# Procesos que generan reportes, carpeta y cantidad de archivos que se guardan en cache
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "2"))
+REPORT_CACHE_DIR = os.getenv("REPORT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "tic_reports"))
+REPORT_CACHE_SIZE = int(os.getenv("REPORT_CACHE_SIZE", "32"))
+REPORT_CACHE_TTL = float(os.getenv("REPORT_CACHE_TTL", "86400"))
+# Excel admite 1.048.576 filas por hoja; para rangos más grandes está /sensor-data/export
+REPORT_MAX_ROWS = int(os.getenv("REPORT_MAX_ROWS", "1000000"))
+# Documentos por lote al leer el rango y segundos que se espera antes de borrar un reporte desalojado
+# (una descarga que ya recibió la ruta puede no haber abierto el archivo todavía)
+REPORT_BATCH_SIZE = int(os.getenv("REPORT_BATCH_SIZE", "10000"))
+REPORT_EVICT_DELAY = float(os.getenv("REPORT_EVICT_DELAY", "60"))
+
+REPORT_FORMATS = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv",
+}
+REPORT_HEADER = ["Medición N°", "Fecha", "Temperatura (°C)", "Ruido", "Luz"]
+
+
+class ReportTooLarge(Exception):
+    pass
+
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+# Borra el archivo desalojado con retraso si hay un loop corriendo, o enseguida si no
+def _evict_file(path):
+    try:
+        asyncio.get_running_loop().call_later(REPORT_EVICT_DELAY, _remove_file, path)
+    except RuntimeError:
+        _remove_file(path)
+
+report_cache = RangeCache(max_size=REPORT_CACHE_SIZE, ttl=REPORT_CACHE_TTL, on_evict=_evict_file)
+_pool = None
+# Generaciones en curso (tarea, PendingRange), para que pedidos simultáneos del mismo reporte esperen al mismo proceso
+_in_flight = {}
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: los procesos no heredan el loop, el cliente de Mongo ni los hilos del proceso de la API
+        _pool = ProcessPoolExecutor(max_workers=REPORT_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+def shutdown_pool():
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+
+
+# Base de datos de cada proceso del pool, con su propia conexión (PyMongo síncrono: el proceso no tiene event loop)
+_worker_db = None
+
+def _worker_collection(name: str):
+    global _worker_db
+    if _worker_db is None:
+        from pymongo import MongoClient
+        from database import MONGO_DB_URL, MONGO_DB_NAME, MONGO_SERVER_SELECTION_TIMEOUT_MS, MONGO_CONNECT_TIMEOUT_MS
+
+        client = MongoClient(
+            MONGO_DB_URL,
+            maxPoolSize=1,
+            serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+            connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+        )
+        _worker_db = client[MONGO_DB_NAME]
+    return _worker_db[name]
+
+# Recorre las lecturas emitiendo una fila por lectura y acumulando sumas para la fila de promedio
+def _report_rows(docs, sums, counts):
+    for i, doc in enumerate(docs):
+        values = [doc.get(metric) for metric in SENSOR_METRICS]
+        for j, value in enumerate(values):
+            if value is not None:
+                sums[j] += value
+                counts[j] += 1
+        yield [i + 1, doc.get("timestamp"), *values]
+
+# Corre en un proceso del pool: lee el rango de Mongo con su propia conexión y escribe el reporte
+# (filas por lectura + fila de promedio) en `path` a medida que llegan los lotes, sin juntar el rango en memoria
+def build_report(collection_name: str, start_date: datetime, end_date: datetime, fmt: str, path: str):
+    docs = _worker_collection(collection_name).find(
+        {"timestamp": {"$gte": start_date, "$lte": end_date}}, ROW_PROJECTION
+    ).sort([("timestamp", 1), ("_id", 1)]).limit(REPORT_MAX_ROWS).batch_size(REPORT_BATCH_SIZE)
+    sums = [0.0] * len(SENSOR_METRICS)
+    counts = [0] * len(SENSOR_METRICS)
+    rows = _report_rows(docs, sums, counts)
+    partial = f"{path}.{os.getpid()}.tmp"
+
+    if fmt == "csv":
+        with open(partial, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(REPORT_HEADER)
+            for row in rows:
+                writer.writerow(["" if value is None else value for value in row])
+            averages = [total / count if count else None for total, count in zip(sums, counts)]
+            writer.writerow(["Promedio", "", *("" if value is None else value for value in averages)])
+    else:
+        from openpyxl import Workbook
+
+        # write_only escribe fila por fila sin armar la hoja completa en memoria
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet("Mediciones")
+        sheet.append(REPORT_HEADER)
+        for row in rows:
+            sheet.append(row)
+        averages = [total / count if count else None for total, count in zip(sums, counts)]
+        sheet.append(["Promedio", None, *averages])
+        workbook.save(partial)
+
+    os.replace(partial, path)
+    return path
+
+
+# Cada generación usa un nombre propio, así desalojar una entrada vieja nunca borra el archivo de una nueva
+def _report_path(start_date: datetime, end_date: datetime, fmt: str) -> str:
+    digest = hashlib.sha1(f"{start_date.isoformat()}|{end_date.isoformat()}".encode("utf-8")).hexdigest()[:16]
+    return os.path.join(REPORT_CACHE_DIR, f"report_{digest}_{uuid.uuid4().hex[:8]}.{fmt}")
+
+async def _generate(collection, start_date: datetime, end_date: datetime, fmt: str) -> str:
+    query = {"timestamp": {"$gte": start_date, "$lte": end_date}}
+    total = await collection.count_documents(query, limit=REPORT_MAX_ROWS + 1)
+    if total > REPORT_MAX_ROWS:
+        raise ReportTooLarge()
+    if total == 0:
+        return None
+
+    # El proceso lee el rango por su cuenta: a la API solo le queda el conteo, y nada del rango pasa por ella
+    os.makedirs(REPORT_CACHE_DIR, exist_ok=True)
+    path = _report_path(start_date, end_date, fmt)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _get_pool(), build_report, collection.name, start_date, end_date, fmt, path
+    )
+
+# Si llegaron lecturas del rango durante la generación, el archivo se entrega pero no se guarda en cache
+async def _generate_and_cache(collection, start_date: datetime, end_date: datetime, fmt: str, pending):
+    try:
+        path = await _generate(collection, start_date, end_date, fmt)
+    finally:
+        report_cache.done(pending)
+    if path and not report_cache.set(fmt, start_date, end_date, path, pending):
+        _evict_file(path)
+    return path
+
+# Devuelve la ruta del reporte del rango, generándolo solo si no está en cache.
+# None si no hay datos en el rango
+async def get_report(collection, start_date: datetime, end_date: datetime, fmt: str):
+    found, path = report_cache.get(fmt, start_date, end_date)
+    if found and os.path.exists(path):
+        return path
+
+    key = (fmt, start_date, end_date)
+    entry = _in_flight.get(key)
+    # Un pedido no se suma a una generación en curso si después de que empezó llegaron lecturas del rango
+    if entry is None or entry[1].touches(start_date, end_date):
+        pending = report_cache.begin()
+        task = asyncio.ensure_future(_generate_and_cache(collection, start_date, end_date, fmt, pending))
+        entry = (task, pending)
+        _in_flight[key] = entry
+        task.add_done_callback(lambda _, entry=entry: _in_flight.pop(key) if _in_flight.get(key) is entry else None)
+    return await asyncio.shield(entry[0])
+
+# Borra los reportes que quedaron en la carpeta (al arrancar y al apagar la API). La carpeta es de un solo
+# proceso: con varios workers de la API cada uno necesita su propio REPORT_CACHE_DIR
+def clear_report_files():
+    report_cache.clear()
+    try:
+        names = os.listdir(REPORT_CACHE_DIR)
+    except OSError:
+        return
+    for name in names:
+        if name.startswith("report_"):
+            _remove_file(os.path.join(REPORT_CACHE_DIR, name))
@@ -0,0 +1,149 @@
+from datetime import datetime
+from pymongo import UpdateOne, ASCENDING
+from database import sensor_collection, rollups_collection
+from models.sensor_data import SENSOR_METRICS as METRICS
+from timeutils import to_utc_naive
+
+# Resoluciones soportadas y la unidad equivalente de $dateTrunc
+RESOLUTIONS = {"minute": "minute", "hour": "hour", "day": "day"}
+
+
+# Trunca una fecha al inicio de su bucket según la resolución
+def bucket_start(ts: datetime, resolution: str) -> datetime:
+    ts = to_utc_naive(ts)
+    if resolution == "minute":
+        return ts.replace(second=0, microsecond=0)
+    if resolution == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    if resolution == "day":
+        return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError(f"Unknown resolution: {resolution}")
+
+
+async def ensure_rollup_indexes():
+    await rollups_collection.create_index(
+        [("resolution", ASCENDING), ("bucket", ASCENDING)], unique=True
+    )
+
+# Agrupa en memoria las lecturas por bucket para emitir un solo upsert por bucket y resolución
+def _accumulate(docs):
+    buckets = {}
+    for doc in docs:
+        ts = doc.get("timestamp")
+        if ts is None:
+            continue
+        for resolution in RESOLUTIONS:
+            key = (resolution, bucket_start(ts, resolution))
+            acc = buckets.setdefault(key, {"count": 0, "metrics": {}})
+            acc["count"] += 1
+            for metric in METRICS:
+                value = doc.get(metric)
+                if value is None:
+                    continue
+                m = acc["metrics"].setdefault(metric, {"count": 0, "sum": 0.0, "min": value, "max": value})
+                m["count"] += 1
+                m["sum"] += value
+                m["min"] = min(m["min"], value)
+                m["max"] = max(m["max"], value)
+    return buckets
+
+# Actualiza incrementalmente los rollups con las lecturas recién insertadas
+async def update_rollups(docs):
+    operations = []
+    for (resolution, bucket), acc in _accumulate(docs).items():
+        inc = {"count": acc["count"]}
+        mins = {}
+        maxs = {}
+        for metric, m in acc["metrics"].items():
+            inc[f"{metric}.count"] = m["count"]
+            inc[f"{metric}.sum"] = m["sum"]
+            mins[f"{metric}.min"] = m["min"]
+            maxs[f"{metric}.max"] = m["max"]
+        update = {"$inc": inc}
+        if mins:
+            update["$min"] = mins
+            update["$max"] = maxs
+        operations.append(UpdateOne({"resolution": resolution, "bucket": bucket}, update, upsert=True))
+
+    if operations:
+        await rollups_collection.bulk_write(operations, ordered=False)
+
+# Convierte un documento de rollup en la respuesta de la API, añadiendo la media por métrica
+def _format_rollup(doc):
+    result = {"bucket": doc["bucket"], "count": doc["count"]}
+    for metric in METRICS:
+        m = doc.get(metric)
+        if not m or not m.get("count"):
+            result[metric] = None
+            continue
+        result[metric] = {
+            "count": m["count"],
+            "sum": m["sum"],
+            "min": m["min"],
+            "max": m["max"],
+            "mean": m["sum"] / m["count"],
+        }
+    return result
+
+# Lee los buckets del rango solicitado; el costo depende de la cantidad de buckets y no de lecturas
+async def query_rollups(resolution: str, start_date: datetime, end_date: datetime):
+    cursor = rollups_collection.find(
+        {
+            "resolution": resolution,
+            "bucket": {"$gte": bucket_start(start_date, resolution), "$lte": to_utc_naive(end_date)},
+        },
+        {"_id": 0},
+    ).sort("bucket", ASCENDING)
+    return [_format_rollup(doc) async for doc in cursor]
+
+# Reconstruye todos los rollups a partir de los datos crudos, agregando en el servidor con $merge
+async def backfill_rollups():
+    await ensure_rollup_indexes()
+    await rollups_collection.delete_many({})
+
+    for resolution, unit in RESOLUTIONS.items():
+        group = {
+            "_id": {"$dateTrunc": {"date": "$timestamp", "unit": unit}},
+            "count": {"$sum": 1},
+        }
+        project = {"_id": 0, "resolution": {"$literal": resolution}, "bucket": "$_id", "count": 1}
+        for metric in METRICS:
+            group[f"{metric}_count"] = {"$sum": {"$cond": [{"$isNumber": f"${metric}"}, 1, 0]}}
+            group[f"{metric}_sum"] = {"$sum": f"${metric}"}
+            group[f"{metric}_min"] = {"$min": f"${metric}"}
+            group[f"{metric}_max"] = {"$max": f"${metric}"}
+            # Sin valores en el bucket $min/$max dan null, y un $min posterior de update_rollups conservaría
+            # ese null para siempre; se omite la métrica, igual que en la actualización incremental
+            project[metric] = {
+                "$cond": [
+                    {"$gt": [f"${metric}_count", 0]},
+                    {
+                        "count": f"${metric}_count",
+                        "sum": f"${metric}_sum",
+                        "min": f"${metric}_min",
+                        "max": f"${metric}_max",
+                    },
+                    "$$REMOVE",
+                ]
+            }
+
+        pipeline = [
+            {"$match": {"timestamp": {"$type": "date"}}},
+            {"$group": group},
+            {"$project": project},
+            {"$merge": {
+                "into": rollups_collection.name,
+                "on": ["resolution", "bucket"],
+                "whenMatched": "replace",
+                "whenNotMatched": "insert",
+            }},
+        ]
+        await sensor_collection.aggregate(pipeline, allowDiskUse=True).to_list(length=None)
+
+
+# Uso: python rollups.py  (reconstruye los rollups desde la colección "sensor")
+if __name__ == "__main__":
+    import asyncio
+
+    asyncio.run(backfill_rollups())
+    print("Rollups reconstruidos")
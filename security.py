@@ -0,0 +1,50 @@
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import os
+import bcrypt
+
+# Costo de bcrypt (log2 de las iteraciones), hilos dedicados y máximo de operaciones en curso o en espera
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+BCRYPT_MAX_WORKERS = int(os.getenv("BCRYPT_MAX_WORKERS", "2"))
+BCRYPT_MAX_PENDING = int(os.getenv("BCRYPT_MAX_PENDING", "16"))
+
+
+class PasswordHasherBusy(Exception):
+    pass
+
+
+# Ejecuta bcrypt en un pool de hilos propio para no bloquear el event loop.
+# Si ya hay BCRYPT_MAX_PENDING operaciones en curso, falla de inmediato en lugar de encolar sin límite.
+class PasswordHasher:
+    def __init__(self, rounds: int = BCRYPT_ROUNDS, max_workers: int = BCRYPT_MAX_WORKERS, max_pending: int = BCRYPT_MAX_PENDING):
+        self.rounds = rounds
+        self.max_pending = max_pending
+        self.pending = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bcrypt")
+
+    async def _run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            raise PasswordHasherBusy()
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self.pending -= 1
+
+    def _hash(self, password: str) -> str:
+        return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds=self.rounds)).decode("utf-8")
+
+    def _verify(self, password: str, hashed: str) -> bool:
+        return bcrypt.checkpw(password.encode("utf-8"), hashed.encode("utf-8"))
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self._hash, password)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        return await self._run(self._verify, password, hashed)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,186 @@
+from datetime import datetime, timedelta
+import math
+import os
+from pymongo import UpdateOne, ASCENDING
+from database import sensor_collection, sketches_collection
+from models.sensor_data import SENSOR_METRICS as METRICS
+from rollups import bucket_start
+from timeutils import to_utc_naive
+
+# Error relativo máximo de los percentiles (0.01 = 1 %); cambiarlo exige reconstruir los sketches
+SKETCH_RELATIVE_ACCURACY = float(os.getenv("SKETCH_RELATIVE_ACCURACY", "0.01"))
+# Valores con módulo menor a esto se cuentan como cero
+SKETCH_MIN_VALUE = 1e-9
+SKETCH_BUCKET = timedelta(hours=1)
+
+
+# DDSketch: cada valor cae en el bin ceil(log_gamma(|x|)) y se guarda solo la cantidad por bin.
+# Cualquier cuantil sale con error relativo <= SKETCH_RELATIVE_ACCURACY, y dos sketches se combinan
+# sumando sus bins, así que en Mongo se actualizan con $inc y un rango se resuelve sumando horas.
+# Las lecturas de los sensores ocupan pocas decenas de bins por hora y métrica.
+class DDSketch:
+    def __init__(self, relative_accuracy: float = SKETCH_RELATIVE_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.count = 0
+        self.zero = 0
+        self.positive = {}
+        self.negative = {}
+
+    def key(self, value: float) -> int:
+        return math.ceil(math.log(abs(value)) / self._log_gamma)
+
+    # Valor representativo del bin (a igual distancia relativa de sus dos bordes)
+    def value(self, key: int) -> float:
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    # Los valores no finitos (NaN, infinito) no tienen bin y se ignoran
+    def add(self, value: float, count: int = 1):
+        if not math.isfinite(value):
+            return
+        self.count += count
+        if abs(value) < SKETCH_MIN_VALUE:
+            self.zero += count
+            return
+        bins = self.positive if value > 0 else self.negative
+        key = self.key(value)
+        bins[key] = bins.get(key, 0) + count
+
+    def merge(self, other: "DDSketch"):
+        self.count += other.count
+        self.zero += other.zero
+        for bins, other_bins in ((self.positive, other.positive), (self.negative, other.negative)):
+            for key, count in other_bins.items():
+                bins[key] = bins.get(key, 0) + count
+
+    def quantile(self, q: float):
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        # De menor a mayor: negativos de mayor a menor módulo, ceros y positivos de menor a mayor módulo
+        for key in sorted(self.negative, reverse=True):
+            seen += self.negative[key]
+            if seen > rank:
+                return -self.value(key)
+        seen += self.zero
+        if seen > rank:
+            return 0.0
+        for key in sorted(self.positive):
+            seen += self.positive[key]
+            if seen > rank:
+                return self.value(key)
+        return self.value(max(self.positive)) if self.positive else 0.0
+
+    # Lee un sketch guardado por update_sketches (las claves de los bins son texto porque son nombres de campo)
+    @classmethod
+    def from_doc(cls, doc, relative_accuracy: float = SKETCH_RELATIVE_ACCURACY):
+        sketch = cls(relative_accuracy)
+        sketch.count = doc.get("count", 0)
+        sketch.zero = doc.get("zero", 0)
+        sketch.positive = {int(key): count for key, count in doc.get("pos", {}).items()}
+        sketch.negative = {int(key): count for key, count in doc.get("neg", {}).items()}
+        return sketch
+
+
+async def ensure_sketch_indexes():
+    await sketches_collection.create_index([("bucket", ASCENDING)], unique=True)
+
+# Arma un sketch por hora y métrica con las lecturas dadas
+def _sketch_docs(docs):
+    buckets = {}
+    for doc in docs:
+        ts = doc.get("timestamp")
+        if ts is None:
+            continue
+        sketches = buckets.setdefault(bucket_start(ts, "hour"), {})
+        for metric in METRICS:
+            value = doc.get(metric)
+            if value is None:
+                continue
+            sketches.setdefault(metric, DDSketch()).add(value)
+    return buckets
+
+# Suma las lecturas recién insertadas a los sketches de su hora: un solo upsert con $inc por hora
+async def update_sketches(docs):
+    operations = []
+    for bucket, sketches in _sketch_docs(docs).items():
+        inc = {}
+        for metric, sketch in sketches.items():
+            inc[f"{metric}.count"] = sketch.count
+            if sketch.zero:
+                inc[f"{metric}.zero"] = sketch.zero
+            for key, count in sketch.positive.items():
+                inc[f"{metric}.pos.{key}"] = count
+            for key, count in sketch.negative.items():
+                inc[f"{metric}.neg.{key}"] = count
+        if inc:
+            operations.append(UpdateOne({"bucket": bucket}, {"$inc": inc}, upsert=True))
+
+    if operations:
+        await sketches_collection.bulk_write(operations, ordered=False)
+
+def _merge_into(merged, metric, sketch):
+    if metric in merged:
+        merged[metric].merge(sketch)
+    else:
+        merged[metric] = sketch
+
+# Combina los sketches de las horas completas del rango; las fracciones de hora de los extremos
+# se leen de las lecturas crudas (a lo sumo dos horas) para que el resultado respete el rango exacto
+async def merge_range(start_date: datetime, end_date: datetime):
+    start = to_utc_naive(start_date)
+    end = to_utc_naive(end_date)
+    first_full = bucket_start(start, "hour")
+    if first_full < start:
+        first_full += SKETCH_BUCKET
+    last_full_end = bucket_start(end, "hour")
+
+    merged = {}
+    raw_ranges = [(start, end)]
+    if first_full < last_full_end:
+        raw_ranges = [(start, first_full), (last_full_end, end)]
+        cursor = sketches_collection.find(
+            {"bucket": {"$gte": first_full, "$lt": last_full_end}}, {"_id": 0, "bucket": 0}
+        )
+        async for doc in cursor:
+            for metric in METRICS:
+                if metric in doc:
+                    _merge_into(merged, metric, DDSketch.from_doc(doc[metric]))
+
+    projection = {"_id": 0, "timestamp": 1, **{metric: 1 for metric in METRICS}}
+    for i, (raw_start, raw_end) in enumerate(raw_ranges):
+        # El primer tramo no incluye el inicio de la primera hora completa; el último incluye end_date
+        upper = "$lte" if i == len(raw_ranges) - 1 else "$lt"
+        cursor = sensor_collection.find({"timestamp": {"$gte": raw_start, upper: raw_end}}, projection)
+        edge = _sketch_docs([doc async for doc in cursor])
+        for sketches in edge.values():
+            for metric, sketch in sketches.items():
+                _merge_into(merged, metric, sketch)
+    return merged
+
+# Reconstruye todos los sketches desde los datos crudos
+async def backfill_sketches(batch_size: int = 5000):
+    await ensure_sketch_indexes()
+    await sketches_collection.delete_many({})
+
+    projection = {"_id": 0, "timestamp": 1, **{metric: 1 for metric in METRICS}}
+    cursor = sensor_collection.find({"timestamp": {"$type": "date"}}, projection).batch_size(batch_size)
+    # Los $inc son aditivos, así que se puede escribir por lotes sin importar el orden de las lecturas
+    pending = []
+    async for doc in cursor:
+        pending.append(doc)
+        if len(pending) >= batch_size:
+            await update_sketches(pending)
+            pending = []
+    if pending:
+        await update_sketches(pending)
+
+
+# Uso: python sketches.py  (reconstruye los sketches de percentiles desde la colección "sensor")
+if __name__ == "__main__":
+    import asyncio
+
+    asyncio.run(backfill_sketches())
+    print("Sketches reconstruidos")
@@ -0,0 +1,129 @@
+from datetime import datetime
+from typing import Optional
+from bson import ObjectId
+from bson.errors import InvalidId
+import base64
+import csv
+import io
+import json
+import orjson
+import os
+from models.sensor_data import SENSOR_METRICS
+
+# Cantidad de documentos que se leen del cursor y se escriben juntos en la respuesta
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "1000"))
+
+# Serialización rápida de /recent y /range: orjson sobre una proyección mínima, sin validar cada fila con pydantic
+FAST_SERIALIZATION = os.getenv("FAST_SERIALIZATION", "true").lower() in ("1", "true", "yes")
+
+# Campos de cada fila, en el mismo orden que SensorData
+ROW_FIELDS = SENSOR_METRICS + ("timestamp", "device_id")
+ROW_PROJECTION = {"_id": 0, **{field: 1 for field in ROW_FIELDS}}
+# La paginación necesita _id para armar el cursor
+PAGE_PROJECTION = {"_id": 1, **{field: 1 for field in ROW_FIELDS}}
+
+MEDIA_TYPES = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+# Elige el formato: primero el parámetro format=, luego la cabecera Accept, y JSON por defecto
+def resolve_format(requested: Optional[str], accept: str) -> str:
+    if requested:
+        return requested
+    if "application/x-ndjson" in accept:
+        return "ndjson"
+    if "text/csv" in accept:
+        return "csv"
+    return "json"
+
+# El cursor de paginación es opaco para el cliente: (timestamp, _id) de la última fila en base64
+def encode_cursor(doc) -> str:
+    raw = json.dumps({"t": doc["timestamp"].isoformat(), "id": str(doc["_id"])})
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(token: str):
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(data["t"]), ObjectId(data["id"])
+    except (ValueError, TypeError, KeyError, InvalidId):
+        raise ValueError("Invalid cursor")
+
+# Filtro por rango de fechas y, opcionalmente, por placa (usa el índice (device_id, timestamp))
+def range_filter(start_date: datetime, end_date: datetime, device_id: Optional[str] = None):
+    query = {"timestamp": {"$gte": start_date, "$lte": end_date}}
+    if device_id is not None:
+        query = {"device_id": device_id, **query}
+    return query
+
+# Agrega al filtro la condición de keyset para continuar después de la última fila entregada
+def keyset_filter(query, token: str):
+    timestamp, last_id = decode_cursor(token)
+    return {"$and": [
+        query,
+        {"$or": [
+            {"timestamp": {"$gt": timestamp}},
+            {"timestamp": timestamp, "_id": {"$gt": last_id}},
+        ]},
+    ]}
+
+
+# Fila con los campos públicos de una lectura, igual a lo que produciría SensorData
+# (las métricas enteras se pasan a float, como hace pydantic)
+def row_to_dict(doc):
+    row = {}
+    for field in SENSOR_METRICS:
+        value = doc.get(field)
+        row[field] = float(value) if isinstance(value, int) else value
+    row["timestamp"] = doc.get("timestamp")
+    row["device_id"] = doc.get("device_id")
+    return row
+
+# Serializa con orjson; OPT_UTC_Z escribe UTC como "Z", igual que pydantic
+def dumps(value) -> bytes:
+    return orjson.dumps(value, option=orjson.OPT_UTC_Z)
+
+# Arreglo JSON con el mismo formato que response_model=List[SensorData], sin validar fila por fila
+def encode_json_rows(docs) -> bytes:
+    return dumps([row_to_dict(doc) for doc in docs])
+
+def _csv_header() -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(ROW_FIELDS)
+    return buffer.getvalue().encode("utf-8")
+
+# Convierte una lista de documentos en NDJSON o CSV (sin cabecera)
+def format_rows(docs, fmt: str) -> bytes:
+    if fmt == "ndjson":
+        return b"".join(dumps(row_to_dict(doc)) + b"\n" for doc in docs)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for doc in docs:
+        row = row_to_dict(doc)
+        if isinstance(row["timestamp"], datetime):
+            row["timestamp"] = row["timestamp"].isoformat()
+        writer.writerow(["" if row[field] is None else row[field] for field in ROW_FIELDS])
+    return buffer.getvalue().encode("utf-8")
+
+# Respuesta completa (no paginada ni en streaming) en NDJSON o CSV
+def render_rows(docs, fmt: str) -> bytes:
+    if fmt == "csv":
+        return _csv_header() + format_rows(docs, fmt)
+    return format_rows(docs, fmt)
+
+# Recorre el cursor de Motor en lotes y va emitiendo el texto; la memoria queda acotada por el lote.
+# `first` es un documento ya leído del cursor (p. ej. para saber antes de responder si el rango está vacío)
+async def stream_rows(cursor, fmt: str, first=None):
+    if fmt == "csv":
+        yield _csv_header()
+    batch = [] if first is None else [first]
+    async for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= STREAM_BATCH_SIZE:
+            yield format_rows(batch, fmt)
+            batch = []
+    if batch:
+        yield format_rows(batch, fmt)
@@ -0,0 +1,71 @@
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+ARDUINO_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "arduino")
+# Al final del path: arduino/main.py no debe tapar el main.py de la API
+sys.path.append(ARDUINO_DIR)
+
+import envio_api
+from envio_api import EnviadorLecturas
+
+LECTURAS = 1200
+CAIDA = 1.5  # Segundos iniciales en que el servidor falso responde 503
+
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# Levanta servidor_falso.py y espera a que acepte conexiones
+def arrancar_servidor(puerto, caida):
+    proceso = subprocess.Popen(
+        [sys.executable, "servidor_falso.py", "--puerto", str(puerto), "--caida", str(caida)],
+        cwd=ARDUINO_DIR, stdout=subprocess.DEVNULL,
+    )
+    limite = time.monotonic() + 10
+    while time.monotonic() < limite:
+        try:
+            socket.create_connection(("127.0.0.1", puerto), timeout=0.1).close()
+            return proceso
+        except OSError:
+            time.sleep(0.05)
+    proceso.kill()
+    raise RuntimeError("El servidor falso no arrancó")
+
+
+def test_uploader_survives_outage(tmp_path, monkeypatch):
+    monkeypatch.setattr(envio_api, "INTERVALO_GUARDADO", 0.1)
+    puerto = puerto_libre()
+    servidor = arrancar_servidor(puerto, CAIDA)
+
+    async def escenario():
+        enviador = EnviadorLecturas(
+            f"http://127.0.0.1:{puerto}", "prueba", ruta_cola=str(tmp_path / "cola.db"),
+            tamano_lote=500, edad_maxima=0.2, backoff_minimo=0.2, backoff_maximo=0.5,
+        )
+        tarea = asyncio.create_task(enviador.ejecutar())
+        try:
+            for i in range(LECTURAS):
+                enviador.agregar({"temperature": 20 + i % 10, "noise": 400, "device_id": "placa-1"})
+            limite = time.monotonic() + 15
+            while enviador.enviadas < LECTURAS and time.monotonic() < limite:
+                await asyncio.sleep(0.1)
+            return enviador.enviadas, enviador.cola.cantidad(), enviador.descartadas
+        finally:
+            tarea.cancel()
+            await asyncio.gather(tarea, return_exceptions=True)
+            enviador.cerrar()
+
+    try:
+        enviadas, pendientes, descartadas = asyncio.run(escenario())
+    finally:
+        servidor.kill()
+        servidor.wait()
+    # Los 503 de la caída se reintentan: nada se pierde ni termina en "descartadas"
+    assert (enviadas, pendientes, descartadas) == (LECTURAS, 0, 0)
@@ -0,0 +1,38 @@
+import os
+
+os.environ.setdefault("API_KEY", "test-api-key")
+
+from fastapi.testclient import TestClient
+import main
+
+
+class FakeRawCursor:
+    def __init__(self, batches):
+        self.batches = list(batches)
+
+    def batch_size(self, size):
+        return self
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.batches:
+            raise StopAsyncIteration
+        return self.batches.pop(0)
+
+
+def test_export_empty_range_returns_404(monkeypatch):
+    class FakeSensor:
+        def find_raw_batches(self, query, projection, sort=None):
+            # Un primer lote vacío también cuenta como rango sin lecturas
+            return FakeRawCursor([b""])
+
+    monkeypatch.setattr(main, "sensor_collection", FakeSensor())
+    client = TestClient(main.app)
+    response = client.get(
+        "/sensor-data/export",
+        params={"start_date": "2024-01-01T00:00:00", "end_date": "2024-01-02T00:00:00"},
+        headers={"x-api-key": "test-api-key"},
+    )
+    assert response.status_code == 404
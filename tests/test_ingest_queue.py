@@ -0,0 +1,54 @@
+import asyncio
+from datetime import datetime, timedelta
+from pymongo.errors import AutoReconnect
+from ingest_queue import IngestQueue
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = list(docs)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.docs:
+            raise StopAsyncIteration
+        return self.docs.pop(0)
+
+
+# Como una colección time-series: sin índice único en _id, reinsertar una fila la duplica
+class FakeTimeseries:
+    def __init__(self):
+        self.docs = []
+        self.calls = 0
+
+    def with_options(self, **kwargs):
+        return self
+
+    async def insert_many(self, docs, ordered=True):
+        self.calls += 1
+        if self.calls == 1:
+            # La conexión se corta después de guardar la mitad del lote
+            self.docs += [dict(doc) for doc in docs[: len(docs) // 2]]
+            raise AutoReconnect("connection reset")
+        self.docs += [dict(doc) for doc in docs]
+
+    def find(self, query, projection):
+        ids = set(query["_id"]["$in"])
+        return FakeCursor({"_id": doc["_id"]} for doc in self.docs if doc["_id"] in ids)
+
+
+def test_retry_after_partial_insert_does_not_duplicate():
+    collection = FakeTimeseries()
+    queue = IngestQueue(write_concern=object())
+    queue._collection = collection
+    start = datetime(2024, 1, 1)
+    batch = [{"timestamp": start + timedelta(seconds=i), "temperature": 20.0, "noise": 400.0} for i in range(10)]
+
+    inserted = asyncio.run(queue._insert(batch))
+
+    assert len(inserted) == 10
+    assert len(collection.docs) == 10
+    assert len({doc["_id"] for doc in collection.docs}) == 10
+    assert queue.dropped == 0
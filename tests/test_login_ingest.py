@@ -0,0 +1,93 @@
+import os
+
+os.environ.setdefault("API_KEY", "test-api-key")
+# Costo suficiente para que un bcrypt en el event loop se note en la latencia de la ingesta
+os.environ.setdefault("BCRYPT_ROUNDS", "10")
+
+import asyncio
+import time
+import httpx
+import pytest
+import main
+from security import password_hasher
+
+EMAIL = "bench@example.com"
+PASSWORD = "secret-password"
+LOGINS = 8
+INGESTS = 40
+
+
+def p95(latencies):
+    ordered = sorted(latencies)
+    return ordered[max(0, round(0.95 * len(ordered)) - 1)]
+
+
+class FakeUsers:
+    def __init__(self, hashed):
+        self.user = {"_id": "64b000000000000000000000", "email": EMAIL, "password": hashed}
+
+    async def find_one(self, query):
+        return self.user if query.get("email") == EMAIL else None
+
+
+class FakeSensor:
+    async def insert_one(self, doc):
+        # Simula el ida y vuelta a Mongo sin bloquear el event loop
+        await asyncio.sleep(0.001)
+        return type("Result", (), {"inserted_id": "id"})()
+
+
+@pytest.fixture
+def app(monkeypatch):
+    async def after_insert(docs):
+        pass
+
+    monkeypatch.setattr(main, "users_collection", FakeUsers(password_hasher._hash(PASSWORD)))
+    monkeypatch.setattr(main, "sensor_collection", FakeSensor())
+    monkeypatch.setattr(main, "_after_insert", after_insert)
+    monkeypatch.setattr(main, "API_KEY", "test-api-key")
+    return main.app
+
+
+async def ingest_latencies(client, count: int):
+    latencies = []
+    for _ in range(count):
+        started = time.perf_counter()
+        response = await client.post(
+            "/sensor-data",
+            json={"temperature": 21.5, "noise": 400.0, "light": 300.0},
+            headers={"x-api-key": "test-api-key"},
+        )
+        latencies.append(time.perf_counter() - started)
+        assert response.status_code == 200
+    return latencies
+
+
+# Con bcrypt en el pool de hilos, una ráfaga de logins no debe frenar la ingesta:
+# el p95 de POST /sensor-data durante los logins se mantiene cerca del p95 sin logins
+def test_ingest_latency_flat_during_login_burst(app):
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            baseline = p95(await ingest_latencies(client, INGESTS))
+
+            # Los logins se lanzan escalonados mientras dura la ingesta, no todos juntos al principio
+            async def login_burst():
+                logins = []
+                for _ in range(LOGINS):
+                    logins.append(asyncio.create_task(
+                        client.post("/login", json={"email": EMAIL, "password": PASSWORD})
+                    ))
+                    await asyncio.sleep(0.005)
+                return await asyncio.gather(*logins)
+
+            burst = asyncio.create_task(login_burst())
+            during = p95(await ingest_latencies(client, INGESTS))
+            responses = await burst
+            return baseline, during, responses
+
+    baseline, during, responses = asyncio.run(scenario())
+
+    assert all(response.status_code == 200 for response in responses)
+    # Un solo bcrypt en el event loop ya costaría decenas de ms; el margen absoluto absorbe el ruido del runner
+    assert during <= baseline * 3 + 0.02, f"p95 ingest {during * 1000:.1f} ms vs baseline {baseline * 1000:.1f} ms"
@@ -0,0 +1,49 @@
+import os
+
+os.environ.setdefault("API_KEY", "test-api-key")
+
+import math
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import ValidationError
+import main
+from models.sensor_data import SensorData
+from sketches import DDSketch
+
+NON_FINITE = [float("nan"), float("inf"), float("-inf")]
+
+
+@pytest.mark.parametrize("metric", ["temperature", "noise", "light"])
+@pytest.mark.parametrize("value", NON_FINITE)
+def test_model_rejects_non_finite(metric, value):
+    reading = {"noise": 400.0, metric: value}
+    with pytest.raises(ValidationError):
+        SensorData(**reading)
+
+
+def test_post_rejects_nan_literal(monkeypatch):
+    inserted = []
+
+    class FakeSensor:
+        async def insert_one(self, doc):
+            inserted.append(doc)
+
+    monkeypatch.setattr(main, "sensor_collection", FakeSensor())
+    client = TestClient(main.app)
+    # El JSON de Python acepta NaN/Infinity como literales
+    for literal in ("NaN", "Infinity", "-Infinity"):
+        response = client.post(
+            "/sensor-data",
+            content=f'{{"temperature": {literal}, "noise": 400}}',
+            headers={"x-api-key": "test-api-key", "content-type": "application/json"},
+        )
+        assert response.status_code == 422
+    assert inserted == []
+
+
+def test_sketch_ignores_non_finite():
+    sketch = DDSketch()
+    for value in [1.0, 2.0, *NON_FINITE, 3.0]:
+        sketch.add(value)
+    assert sketch.count == 3
+    assert math.isclose(sketch.quantile(0.5), 2.0, rel_tol=0.02)
@@ -0,0 +1,80 @@
+import asyncio
+import logging
+import os
+import subprocess
+import sys
+import pytest
+
+pytest.importorskip("tty", reason="el Arduino falso necesita un pty (solo Linux/macOS)")
+
+ARDUINO_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "arduino")
+# Al final del path: arduino/main.py no debe tapar el main.py de la API
+sys.path.append(ARDUINO_DIR)
+
+from transporte_serial import ArduinoSerial
+
+DEMORA = 0.5  # Lo que tarda el Arduino falso en responder cada comando
+
+
+# Levanta arduino_falso.py y devuelve (proceso, ruta del pty)
+def arrancar_arduino(demora):
+    proceso = subprocess.Popen(
+        [sys.executable, "arduino_falso.py", "--demora", str(demora)],
+        cwd=ARDUINO_DIR, stdout=subprocess.PIPE, text=True,
+    )
+    return proceso, proceso.stdout.readline().strip()
+
+
+# Abre el pty con las pipes de asyncio; pyserial-asyncio no hace falta para un pty en modo raw
+async def conectar(ruta, timeout, drenaje):
+    loop = asyncio.get_running_loop()
+    fd = os.open(ruta, os.O_RDWR | os.O_NOCTTY)
+    reader = asyncio.StreamReader()
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), os.fdopen(fd, "rb", buffering=0))
+    transporte, protocolo = await loop.connect_write_pipe(
+        asyncio.streams.FlowControlMixin, os.fdopen(os.dup(fd), "wb", buffering=0)
+    )
+    writer = asyncio.StreamWriter(transporte, protocolo, reader, loop)
+    arduino = ArduinoSerial(reader, writer, timeout=timeout, drenaje=drenaje)
+    arduino.iniciar()
+    return arduino
+
+
+@pytest.fixture
+def arduino_falso():
+    proceso, ruta = arrancar_arduino(DEMORA)
+    yield ruta
+    proceso.kill()
+    proceso.wait()
+
+
+def test_round_trip(arduino_falso):
+    async def escenario():
+        arduino = await conectar(arduino_falso, timeout=2.0, drenaje=1.0)
+        try:
+            return await arduino.enviar("modo1"), await arduino.enviar("modo3")
+        finally:
+            await arduino.cerrar()
+
+    modo1, modo3 = asyncio.run(escenario())
+    assert modo1 == "Modo 1 activo: LED encendido"
+    assert float(modo3)
+
+
+def test_timeout_discards_late_reply(arduino_falso, caplog):
+    async def escenario():
+        arduino = await conectar(arduino_falso, timeout=DEMORA / 4, drenaje=DEMORA * 2)
+        try:
+            with pytest.raises(asyncio.TimeoutError):
+                await arduino.enviar("modo3")
+            # La temperatura del modo3 llega durante el drenaje: no puede quedar como respuesta ni como evento
+            respuesta = await arduino.enviar("modo2", timeout=DEMORA * 4)
+            return respuesta, arduino.eventos.qsize()
+        finally:
+            await arduino.cerrar()
+
+    with caplog.at_level(logging.INFO):
+        respuesta, eventos = asyncio.run(escenario())
+    assert respuesta == "Modo 2 activo: LED apagado"
+    assert eventos == 0
+    assert any("Respuesta tardía descartada" in record.getMessage() for record in caplog.records)
@@ -0,0 +1,8 @@
+from datetime import datetime, timezone
+
+
+# Normaliza a UTC naive, que es como Mongo guarda y devuelve las fechas
+def to_utc_naive(ts: datetime) -> datetime:
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts